@@ -0,0 +1,79 @@
+import time
+import argparse
+from tabulate import tabulate
+from structural import Vec3
+from core.parser import FileParser, LineParser, CarbonAlpha, Structure
+
+# single-pass parser compared with the previous implementation, which rescans the file for every atom
+
+
+class ScanningFileParser:
+    def __init__(self, file):
+        self.file = file 
+        stream = open(file)
+        self._lines = stream.readlines()
+        stream.close()
+
+    @property
+    def lines(self):
+        return [line for line in self._lines if len(line) >= 4]
+    
+    def parse_ca(self):
+        return [line for line in self.lines if line[0:4] == "ATOM" and line[12:16].strip() == "CA"]
+    
+    def parse_range(self, record, initial_start, initial_end):
+        numbers = []
+        for line in self.lines:
+            if line[0:5] == record:
+                for i in range(int(line[initial_start:initial_end].strip()), int(line[33:37].strip())+1):
+                    numbers.append(i)
+        return numbers
+
+    def parse_helix(self):
+        return self.parse_range("HELIX", 21, 25)
+
+    def parse_sheet(self):
+        return self.parse_range("SHEET", 22, 26)
+    
+    def load_atoms(self):
+        atoms = []
+        for record in self.parse_ca():
+            parser = LineParser(record)
+            coordinates = Vec3(x=parser.parse_x(), y=parser.parse_y(), z=parser.parse_z())
+            arguments = {"id": parser.parse_id(), "residue": parser.parse_residue(), "residue_id": parser.parse_residue_id(), "chain_name": parser.parse_chain_name(), "coordinates": coordinates}
+            if arguments["residue_id"] not in self.parse_helix() and arguments["residue_id"] not in self.parse_sheet():
+                atoms.append(CarbonAlpha(ss="C", **arguments))
+            else:
+                if arguments["residue_id"] in self.parse_helix():
+                    atoms.append(CarbonAlpha(ss="H", **arguments))
+                if arguments["residue_id"] in self.parse_sheet():
+                    atoms.append(CarbonAlpha(ss="E", **arguments))
+        return atoms
+
+    def load_structure(self):
+        return Structure(atoms=self.load_atoms())
+
+
+def best_time(parser, file, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        structure = parser(file).load_structure()
+        times.append(time.perf_counter() - start)
+    return min(times), structure
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", type=str, nargs="+", help="PDB files")
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="measurements per file, the fastest one is reported")
+    args = parser.parse_args()
+
+    table = []
+    for file in args.files:
+        scanning, previous = best_time(ScanningFileParser, file, args.repeats)
+        single_pass, current = best_time(FileParser, file, args.repeats)
+        same_ss = current.read_secondary_structure(current.residue_ids()[0], current.residue_ids()[-1]) == previous.read_secondary_structure(previous.residue_ids()[0], previous.residue_ids()[-1])
+        table.append([file, current.length(), f"{scanning:.4f}", f"{single_pass:.4f}", f"{scanning / single_pass:.1f}x", same_ss])
+
+    print(tabulate(table, headers=["file", "CA atoms", "previous [s]", "single pass [s]", "speedup", "same SS"]))
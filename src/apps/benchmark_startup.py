@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import glob
+import argparse
+import subprocess
+from tabulate import tabulate
+
+# startup cost of every entry point: module-level imports and a first real call through the command line interface
+# calls are given as a JSON file mapping entry point names to argument lists, entry points without one report imports only
+
+IMPORT = "import time, runpy; start = time.perf_counter(); runpy.run_path({path!r}, run_name='benchmark'); print(time.perf_counter() - start)"
+CALL = "import time, sys, runpy; sys.argv = [{path!r}, *{arguments!r}]; start = time.perf_counter()\ntry:\n    runpy.run_path({path!r}, run_name='__main__')\nexcept SystemExit as error:\n    if error.code not in (None, 0):\n        raise\nprint(time.perf_counter() - start, file=sys.stderr)"
+
+
+def measure(code, root, stream, directory):
+    # fresh interpreter for every measurement, so nothing is cached between entry points
+    environment = {**os.environ, "PYTHONPATH": os.pathsep.join([root, os.environ.get("PYTHONPATH", "")])}
+    result = subprocess.run([sys.executable, "-c", code], cwd=directory, env=environment, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    output = result.stdout if stream == "stdout" else result.stderr
+    return float(output.strip().splitlines()[-1])
+
+
+def best_of(code, root, stream, repeats, directory=None):
+    times = [measure(code, root, stream, directory or root) for _ in range(repeats)]
+    times = [time for time in times if time is not None]
+    return min(times) if times else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="measurements per entry point, the fastest one is reported")
+    parser.add_argument("--calls", type=str, help="JSON file mapping entry points to arguments of a minimal real call, relative paths start at its directory")
+    parser.add_argument("--budget", type=float, help="maximum seconds allowed for any measurement")
+    parser.add_argument("--baseline", type=str, help="JSON file with previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown against the baseline")
+    parser.add_argument("--save", type=str, help="write results as JSON")
+    args = parser.parse_args()
+
+    apps = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.dirname(apps)
+
+    calls = {}
+    if args.calls is not None:
+        with open(args.calls) as stream:
+            calls = json.load(stream)
+        directory = os.path.dirname(os.path.abspath(args.calls))
+
+    results = {}
+    for path in sorted(glob.glob(f"{apps}/*.py")):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if path == os.path.abspath(__file__):
+            continue
+        results[name] = {"import": best_of(IMPORT.format(path=path), root, "stdout", args.repeats)}
+        if name in calls:
+            results[name]["first_call"] = best_of(CALL.format(path=path, arguments=calls[name]), root, "stderr", args.repeats, directory)
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+
+    failures = []
+    for name, times in results.items():
+        for kind, seconds in times.items():
+            if seconds is None:
+                failures.append(f"{name} {kind} failed")
+                continue
+            if args.budget is not None and seconds > args.budget:
+                failures.append(f"{name} {kind} {seconds:.3f}s over budget {args.budget:.3f}s")
+            previous = baseline.get(name, {}).get(kind)
+            if previous is not None and seconds > previous * (1 + args.tolerance):
+                failures.append(f"{name} {kind} {seconds:.3f}s slower than baseline {previous:.3f}s")
+
+    table = [[name, *[f"{times[kind]:.3f}" if times.get(kind) is not None else "-" for kind in ["import", "first_call"]]] for name, times in results.items()]
+    print(tabulate(table, headers=["entry point", "import [s]", "first call [s]"]))
+
+    if args.save is not None:
+        with open(args.save, "w") as stream:
+            json.dump(results, stream, indent=2)
+
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
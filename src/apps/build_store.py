@@ -0,0 +1,19 @@
+import argparse
+import logging
+from core.store import FragmentStoreWriter
+
+logging.getLogger("tensorflow").disabled=True
+logging.getLogger("h5py._conv").disabled=True
+
+# convert text data file to sharded binary fragment store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--file", type=str, help="path to the data file")
+    parser.add_argument("-o", "--output", type=str, help="store directory")
+    parser.add_argument("-s", "--shard", type=int, default=1000000, help="maximum number of fragments in a single shard")
+    args = parser.parse_args()
+
+    writer = FragmentStoreWriter(directory=args.output, shard_size=args.shard)
+    writer.add_file(args.file)
+    writer.close()
@@ -2,9 +2,9 @@ import os
 import argparse
 import logging
 import numpy as np
-from core.model import DecoderLoader
-from core.features import LabelMLP
-from structural import Output
+from core.inference import load_decoder
+from core.features import SS_CODES, ss_indices
+from core.geometry import decode_angles, angles_by_ss
 
 logging.getLogger("tensorflow").disabled=True
 logging.getLogger("h5py._conv").disabled=True
@@ -13,42 +13,34 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-m", "--model", type=str)
     parser.add_argument("-l", "--labels", type=str)
+    parser.add_argument("--sampling", type=str, default="empirical", choices=["empirical", "posterior", "gaussian", "prior"], help="source of latent vectors")
+    parser.add_argument("--seed", type=int, help="seed of latent sampling")
+    parser.add_argument("--engine", type=str, default="auto", choices=["auto", "numpy", "tensorflow"], help="decoder backend, NumPy whenever decoder.npz exists by default")
+    parser.add_argument("-c", "--chunk", type=int, default=100000, help="number of labels decoded at once")
     args = parser.parse_args()
     
     model = args.model 
-    labels = np.load(args.labels)
+    labels = np.load(args.labels, mmap_mode="r") # labels are read chunk by chunk
 
     work_directory = os.path.dirname(os.path.abspath(__file__))
-    
-    # number of rebuilt residues
-    n = int((np.shape(labels)[1] - 3) / 23)
-
-    decoder = DecoderLoader(decoder=f"{model}/decoder.pb", latent=f"{model}/latent.npy") # part of model which is actually used
-    reconstructed_data = decoder.predict(labels)
-
-    ss = []
-    for label in labels:
-        ss.append(LabelMLP.extract_ss(label))
-
-    alpha = []
-    theta = []
-    for vector in reconstructed_data:
-        output = Output(vector=vector)
-        alpha.append(output.alpha())
-        theta.append(output.theta())
-
-    h_angles = []
-    e_angles = []
-    c_angles = []
-    for ss, alpha, theta in zip(ss, alpha, theta):
-        for i in range(n):
-            if ss[i] == "H":
-                h_angles.append([alpha[i], theta[i]])
-            if ss[i] == "E":
-                e_angles.append([alpha[i], theta[i]])
-            if ss[i] == "C":
-                c_angles.append([alpha[i], theta[i]])
-
-    np.save(f"{work_directory}/h_reconstructed.npy", h_angles)
-    np.save(f"{work_directory}/e_reconstructed.npy", e_angles)
-    np.save(f"{work_directory}/c_reconstructed.npy", c_angles)
\ No newline at end of file
+
+    chunks = [slice(start, start + args.chunk) for start in range(0, len(labels), args.chunk)]
+
+    # residues of each secondary structure type, so outputs can be preallocated
+    counts = np.zeros(len(SS_CODES), dtype=np.int64)
+    for chunk in chunks:
+        counts += np.bincount(ss_indices(labels[chunk]).ravel(), minlength=len(SS_CODES))
+
+    outputs = {code: np.lib.format.open_memmap(f"{work_directory}/{code.lower()}_reconstructed.npy", mode="w+", dtype=np.float64, shape=(count, 2)) for code, count in zip(SS_CODES, counts.tolist())} # plain ints, NumPy scalars in the header are unreadable
+    filled = {code: 0 for code in SS_CODES}
+
+    decoder = load_decoder(model, engine=args.engine, sampling=args.sampling, seed=args.seed) # part of model which is actually used
+    for chunk in chunks:
+        chunk_labels = np.asarray(labels[chunk], dtype=np.float32)
+        alpha, theta = decode_angles(decoder.predict(chunk_labels))
+        for code, angles in angles_by_ss(alpha, theta, ss_indices(chunk_labels), SS_CODES).items():
+            outputs[code][filled[code]:filled[code]+len(angles)] = angles
+            filled[code] += len(angles)
+
+    for output in outputs.values():
+        output.flush()
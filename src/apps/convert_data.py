@@ -1,7 +1,7 @@
 import os
 import argparse
 import logging
-from core.features import DataSetMLP
+from core.features import DataSetMLP, DataSetBulkMLP
 
 logging.getLogger("tensorflow").disabled=True
 logging.getLogger("h5py._conv").disabled=True
@@ -11,10 +11,20 @@ logging.getLogger("h5py._conv").disabled=True
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", "--file", type=str, help="path to the data file")
+    parser.add_argument("--mode", type=str, choices=["bulk", "stream", "tensor"], default="bulk", help="column-wise NumPy conversion, the same written through memory-mapped files, or per-observation tensors")
+    parser.add_argument("-c", "--chunk", type=int, default=100000, help="number of lines parsed at once in bulk and stream modes")
     args = parser.parse_args()
 
     work_directory = f"{os.path.dirname(args.file)}"
 
-    data = DataSetMLP(file=args.file)
-    data.save_inputs(f"{work_directory}/inputs.npy")
-    data.save_labels(f"{work_directory}/labels.npy")
\ No newline at end of file
+    if args.mode == "stream":
+        logging.basicConfig(format="%(asctime)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S", level=logging.INFO)
+        data = DataSetBulkMLP(file=args.file, chunk_size=args.chunk)
+        data.stream(f"{work_directory}/inputs.npy", f"{work_directory}/labels.npy")
+    elif args.mode == "bulk":
+        data = DataSetBulkMLP(file=args.file, chunk_size=args.chunk)
+        data.save(f"{work_directory}/inputs.npy", f"{work_directory}/labels.npy")
+    else:
+        data = DataSetMLP(file=args.file)
+        data.save_inputs(f"{work_directory}/inputs.npy")
+        data.save_labels(f"{work_directory}/labels.npy")
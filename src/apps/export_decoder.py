@@ -0,0 +1,17 @@
+import argparse
+import logging
+import tensorflow as tf
+from core.inference import export_decoder
+
+logging.getLogger("tensorflow").disabled=True
+logging.getLogger("h5py._conv").disabled=True
+
+# write weights of a trained decoder for the NumPy inference engine
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--model", type=str, help="model directory")
+    args = parser.parse_args()
+
+    decoder = tf.keras.models.load_model(f"{args.model}/decoder.h5")
+    export_decoder(decoder, f"{args.model}/decoder.npz")
@@ -1,18 +1,19 @@
 import os
 import argparse
-from data import all_samples
+import logging
+from data import write_samples
 
 # get all observations from given directory
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-p", "--path", type=str, help="path to the directory")
+    parser.add_argument("-t", "--threads", type=int, default=0, help="number of worker threads, all available cores by default")
     args = parser.parse_args()
 
-    file = open(f"{os.path.dirname(args.path)}/fragments.dat", "a")
+    logging.basicConfig(format="%(asctime)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S", level=logging.INFO)
 
-    lines = all_samples(args.path)
-    for line in lines:
-        print(line, file=file) 
+    report = write_samples(args.path, f"{os.path.dirname(args.path)}/fragments.dat", args.threads)
 
-    file.close()
\ No newline at end of file
+    logging.info(f"files: {report.files} ({report.files_per_second():.1f}/s), unreadable files: {report.failed_files}")
+    logging.info(f"lines: {report.lines} ({report.lines_per_second():.1f}/s), rejected lines: {report.rejected_lines}")
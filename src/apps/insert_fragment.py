@@ -1,19 +1,17 @@
 import os
 import argparse
 import logging
-import numpy as np
-import tensorflow as tf
 from tabulate import tabulate
-from core.model import DecoderLoader
-from core.features import LabelMLP
-from core.parser import FileParser, Structure, CarbonAlpha
-from structural import Vec3, Output, two_atoms_vector, build_fragment, compute_rmsd
+from core.inference import load_decoder
+from core.parser import FileParser
+from core.cache import StructureCache
+from core.ranking import Ranking, parse_weights
+from core.adaptive import AdaptiveSampler
+from core.rebuild import fragment_label, labels, build_candidates, rank, write_models, output_path
 
 logging.getLogger("tensorflow").disabled=True
 logging.getLogger("h5py._conv").disabled=True
 
-BOND_LENGTH = 3.8
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-aa", type=str, help="amino acids sequence")
@@ -24,7 +22,22 @@ if __name__ == "__main__":
     parser.add_argument("-m", "--model", type=str, help="model to be used")
     parser.add_argument("-r", "--repeats", type=int, help="number of returned fragments")
     parser.add_argument("-p", "--population", type=int, help="number of fragments generated to choose the best one")
+    parser.add_argument("--sampling", type=str, default="empirical", choices=["empirical", "posterior", "gaussian", "prior"], help="source of latent vectors")
+    parser.add_argument("--seed", type=int, help="seed of latent sampling")
+    parser.add_argument("--engine", type=str, default="auto", choices=["auto", "numpy", "tensorflow"], help="decoder backend, NumPy whenever decoder.npz exists by default")
+    parser.add_argument("--weights", type=str, default="closure=1", help="score terms and weights, e.g. closure=1,clashes=0.5,rmsd=0.1")
+    parser.add_argument("--max-clashes", type=int, default=0, help="candidates with more clashes are rejected")
+    parser.add_argument("--adaptive", action="store_true", help="generate candidates in rounds until enough of them pass, starting with --population")
+    parser.add_argument("--closure-threshold", type=float, default=float("inf"), help="largest accepted closure error in adaptive mode")
+    parser.add_argument("--max-samples", type=int, help="sample budget in adaptive mode, 100 times --population by default")
+    parser.add_argument("--time-budget", type=float, help="seconds budget in adaptive mode")
+    parser.add_argument("--superpose", action="store_true", help="score window RMSD after optimal superposition")
+    parser.add_argument("--format", type=str, default="pdb", choices=["pdb", "trajectory"], help="multi-model PDB or binary trajectory directory")
+    parser.add_argument("--cache", type=str, help="directory of the parsed structure cache")
+    parser.add_argument("--server", type=str, help="host:port of a running fragment server, the model is loaded locally otherwise")
     args = parser.parse_args()
+    if args.server is not None and args.seed is not None:
+        parser.error("--seed cannot be used with --server, requests share the latent sampler of the server")
 
     pdb = args.file
     start = args.start 
@@ -33,96 +46,33 @@ if __name__ == "__main__":
     repeats = args.repeats
     population = args.population
 
-    input_structure = FileParser(file=pdb).load_structure() 
+    cache = StructureCache(args.cache) if args.cache is not None else None
+    input_structure = FileParser(file=pdb, cache=cache).load_structure() 
 
-    if args.aa == None:
-        aa = input_structure.read_sequence(start, end)
-    else:
-        aa = args.aa
+    aa, ss, displacement = fragment_label(input_structure, start, end, args.aa, args.ss)
 
-    if args.ss == None:
-        ss = input_structure.read_secondary_structure(start, end)
+    if args.server is not None:
+        from core.server import FragmentClient
+        client = FragmentClient(args.server)
+        generate = lambda k: client.generate(os.path.abspath(model), aa, ss, displacement, k, sampling=args.sampling, engine=args.engine) # raw data from decoder
     else:
-        ss = args.ss
-
-    displacement = input_structure.local_displacement(start, end)
-
-    dx = displacement.x
-    dy = displacement.y
-    dz = displacement.z
-
-    decoder = DecoderLoader(decoder=f"{model}/decoder.pb", latent=f"{model}/latent.npy")
-    labels = [LabelMLP(aa=aa, ss=ss, dx=dx, dy=dy, dz=dz).format() for _ in range(population)]
-    labels = tf.reshape(labels, shape=(population, tf.shape(labels)[2]))
-
-    vectors = decoder.predict(labels) # raw data from decoder
-    outputs = [Output(vector) for vector in vectors]
-
-    # bound atoms not included in rebuilt fragment
-    c_1 = input_structure.atoms[input_structure.find_residue(start-3)].coordinates
-    c_2 = input_structure.atoms[input_structure.find_residue(start-2)].coordinates
-    c_3 = input_structure.atoms[input_structure.find_residue(start-1)].coordinates
-
-    # convert generated angles to cartesian
-    fragments = [build_fragment(c_1, c_2, c_3, output, BOND_LENGTH) for output in outputs] 
-
-    new_structures = [] # all structures obtained from generated results
-    for fragment in fragments:
-        new_atoms = []
-        for atom in input_structure.atoms:
-            if atom.residue_id >= start and atom.residue_id <= end:
-                vec_index = atom.residue_id - start + 3
-                x = fragment[vec_index].x
-                y = fragment[vec_index].y
-                z = fragment[vec_index].z
-                coordinates = Vec3(x=x, y=y, z=z)
-                new_atom = CarbonAlpha(ss=atom.ss, id=atom.id, residue=atom.residue, chain_name=atom.chain_name, residue_id=atom.residue_id, coordinates=coordinates)
-                new_atoms.append(new_atom)
-            else:
-                new_atoms.append(atom)
-        
-        structure = Structure(atoms=new_atoms)
-        new_structures.append(structure)
-
-    valid_structures = [] # choose structures which are not crossed 
-    for structure in new_structures:
-        if structure.check_if_crossing(tolerance=1.0)[0] == False:
-            valid_structures.append(structure)
-
-    last_bond_lengths = []
-    for structure in valid_structures:
-        last_bond_length = structure.local_displacement(end, end+1).length()
-        last_bond_lengths.append(last_bond_length)
-
-    last_bond_errors = [np.abs(BOND_LENGTH - length) for length in last_bond_lengths]
-    sorted_last_bond_errors = np.sort(last_bond_errors)
-
-    # select structures with the smallest last bond error
-    if len(valid_structures) >= repeats:
-        matching_structures = []
-        for error in sorted_last_bond_errors[0:repeats]:
-            structure = valid_structures[last_bond_errors.index(error)]
-            matching_structures.append(structure)
+        decoder = load_decoder(model, engine=args.engine, sampling=args.sampling, seed=args.seed)
+        generate = lambda k: decoder.predict(labels(input_structure, start, end, k, aa, ss)) # raw data from decoder
+
+    # select structures with the best score
+    ranking = Ranking(weights=parse_weights(args.weights), max_clashes=args.max_clashes, superpose=args.superpose)
+
+    if args.adaptive:
+        sampler = AdaptiveSampler(generate, repeats, ranking, closure_threshold=args.closure_threshold, round_size=population, max_samples=args.max_samples, max_seconds=args.time_budget)
+        coordinates, scores = sampler.run(input_structure, start, end)
+        rounds = [[report.round, report.generated, report.accepted, f"{report.acceptance_rate:.3f}", f"{report.seconds:.3f}"] for report in sampler.rounds]
+        print(tabulate(rounds, headers=["round", "generated", "accepted", "acceptance rate", "seconds"]))
+        print(f"Sampling stopped: {sampler.reason}")
     else:
-        matching_structures = valid_structures
-
-    pdb_name = os.path.splitext(os.path.basename(pdb))[0]
-    output_path = f"{os.path.dirname(__file__)}/{pdb_name}_output.pdb"
-    
-    output_file = open(output_path, "a")
-    
-    for i, structure in enumerate(matching_structures):
-        print(f"MODEL {i+1}", file=output_file)
-        last_bond_vector = two_atoms_vector(structure.atoms[structure.find_residue(end)].coordinates, input_structure.atoms[input_structure.find_residue(end+1)].coordinates)
-        rmsd = compute_rmsd(structure.coordinates(), input_structure.coordinates())
-        print(f"{last_bond_vector.length():.3f}", file=output_file)
-        print(f"{rmsd:.3f}", file=output_file)
-
-        lines = structure.to_pdb()
-        for line in lines:
-            print(line, file=output_file)
+        candidates = build_candidates(input_structure, start, end, generate(population))
+        coordinates, scores, _ = rank(input_structure, start, end, candidates, repeats, ranking)
 
-    output_file.close()
+    write_models(output_path(os.path.dirname(__file__), pdb, start, format=args.format), input_structure, start, end, coordinates, scores, format=args.format)
 
     table = [["Amino acids sequence", f"{aa}"], ["Secondary structure", f"{ss}"]]
     print(tabulate(table))
\ No newline at end of file
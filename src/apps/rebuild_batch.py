@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import argparse
+import logging
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from core.inference import load_decoder
+from core.parser import FileParser
+from core.cache import StructureCache
+from core.ranking import Ranking, parse_weights
+from core.rebuild import labels, build_candidates, rank, write_models, output_path
+
+logging.getLogger("tensorflow").disabled=True
+logging.getLogger("h5py._conv").disabled=True
+
+# rebuild many loops in one process, the decoder is loaded once and jobs with labels of equal length share decoder calls
+# manifest is a JSON lines file with "file", "start", "end" and optionally "aa", "ss", "population", "repeats"
+
+
+def describe(error):
+    return f"{type(error).__name__}: {error}"
+
+
+@functools.lru_cache(maxsize=64)
+def load_structure(file, cache=None):
+    # every structure is parsed once per process, and once overall with a cache directory
+    return FileParser(file=file, cache=StructureCache(cache) if cache is not None else None).load_structure()
+
+
+def process(job, vectors, output_directory, ranking, format="pdb", cache=None):
+    # geometry, clash filtering and writing of a single job
+    start = time.perf_counter()
+    structure = load_structure(job["file"], cache)
+    candidates = build_candidates(structure, job["start"], job["end"], vectors)
+    coordinates, scores, valid = rank(structure, job["start"], job["end"], candidates, job["repeats"], ranking)
+    path = output_path(output_directory, job["file"], job["start"], job["end"], format)
+    write_models(path, structure, job["start"], job["end"], coordinates, scores, format)
+    return {"output": path, "valid": int(valid), "selected": len(coordinates), "geometry_seconds": time.perf_counter() - start}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", "--jobs", type=str, help="manifest of jobs")
+    parser.add_argument("-m", "--model", type=str, help="model to be used")
+    parser.add_argument("-o", "--output", type=str, help="output directory")
+    parser.add_argument("-r", "--repeats", type=int, default=1, help="number of returned fragments unless given per job")
+    parser.add_argument("-p", "--population", type=int, default=100, help="number of generated fragments unless given per job")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="workers building and filtering candidates")
+    parser.add_argument("--sampling", type=str, default="empirical", choices=["empirical", "posterior", "gaussian", "prior"], help="source of latent vectors")
+    parser.add_argument("--seed", type=int, help="seed of latent sampling")
+    parser.add_argument("--weights", type=str, default="closure=1", help="score terms and weights, e.g. closure=1,clashes=0.5,rmsd=0.1")
+    parser.add_argument("--max-clashes", type=int, default=0, help="candidates with more clashes are rejected")
+    parser.add_argument("--superpose", action="store_true", help="score window RMSD after optimal superposition")
+    parser.add_argument("--format", type=str, default="pdb", choices=["pdb", "trajectory"], help="multi-model PDB or binary trajectory directory")
+    parser.add_argument("--cache", type=str, help="directory of the parsed structure cache")
+    parser.add_argument("--engine", type=str, default="auto", choices=["auto", "numpy", "tensorflow"], help="decoder backend, NumPy whenever decoder.npz exists by default")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+
+    with open(args.jobs) as stream:
+        jobs = [json.loads(line) for line in stream if line.strip()]
+    for job in jobs:
+        job.setdefault("population", args.population)
+        job.setdefault("repeats", args.repeats)
+
+    ranking = Ranking(weights=parse_weights(args.weights), max_clashes=args.max_clashes, superpose=args.superpose, threads=1) # the process pool already uses every core
+    decoder = load_decoder(args.model, engine=args.engine, sampling=args.sampling, seed=args.seed)
+
+    # labels of all jobs, grouped by their dimension, a failing job is recorded and skipped
+    timings = [{} for _ in jobs]
+    groups = {}
+    for i, job in enumerate(jobs):
+        start = time.perf_counter()
+        try:
+            job_labels = labels(load_structure(job["file"], args.cache), job["start"], job["end"], job["population"], job.get("aa"), job.get("ss"))
+        except Exception as error:
+            timings[i]["error"] = describe(error)
+            continue
+        timings[i]["label_seconds"] = time.perf_counter() - start
+        groups.setdefault(job_labels.shape[1], []).append((i, job_labels))
+
+    # one decoder call per group
+    vectors = [None for _ in jobs]
+    for members in groups.values():
+        start = time.perf_counter()
+        try:
+            predicted = decoder.predict(np.concatenate([job_labels for _, job_labels in members]))
+        except Exception as error: # e.g. fragments of a length the model was not trained for
+            for i, _ in members:
+                timings[i]["error"] = describe(error)
+            continue
+        seconds = time.perf_counter() - start
+        offset = 0
+        for i, job_labels in members:
+            vectors[i] = predicted[offset:offset+len(job_labels)]
+            offset += len(job_labels)
+            timings[i]["decoder_seconds"] = seconds * len(job_labels) / len(predicted) # share of the group call
+
+    context = multiprocessing.get_context("spawn")
+    results = [{} for _ in jobs]
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=context) as executor:
+        futures = {i: executor.submit(process, job, vectors[i], args.output, ranking, args.format, args.cache) for i, job in enumerate(jobs) if vectors[i] is not None}
+        for i, future in futures.items():
+            try:
+                results[i] = future.result()
+            except Exception as error:
+                results[i] = {"error": describe(error)}
+
+    summary = [{**job, **timings[i], **results[i]} for i, job in enumerate(jobs)]
+    with open(f"{args.output}/summary.json", "w") as stream:
+        json.dump(summary, stream, indent=2)
+
+    failed = sum(1 for entry in summary if "error" in entry)
+    if failed:
+        print(f"{failed} of {len(jobs)} jobs failed, see {args.output}/summary.json")
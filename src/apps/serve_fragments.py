@@ -0,0 +1,25 @@
+import os
+import argparse
+import logging
+from core.server import FragmentServer
+
+logging.getLogger("tensorflow").disabled=True
+logging.getLogger("h5py._conv").disabled=True
+
+# keep decoders loaded and answer fragment generation requests on localhost
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("-m", "--model", type=str, action="append", default=[], help="model loaded at startup, may be repeated")
+    parser.add_argument("--max-batch", type=int, default=100000, help="maximum number of rows in one decoder call")
+    parser.add_argument("--max-wait", type=float, default=0.005, help="seconds spent gathering requests into one batch")
+    args = parser.parse_args()
+
+    server = FragmentServer((args.host, args.port), max_batch=args.max_batch, max_wait=args.max_wait)
+    for model in args.model:
+        server.batcher(os.path.abspath(model))
+
+    print(f"Serving on {args.host}:{args.port}")
+    server.serve_forever()
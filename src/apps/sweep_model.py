@@ -0,0 +1,35 @@
+import os
+import json
+import argparse
+import logging
+from tabulate import tabulate
+from core.sweep import SWEPT, grid, random_search, write_configs, sweep, score
+
+# train many model configurations concurrently and rank them by final loss
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-cfg", "--config", type=str, help="base configuration file path")
+    parser.add_argument("-s", "--space", type=str, help="JSON file mapping parameters to lists of values")
+    parser.add_argument("-o", "--output", type=str, help="sweep directory")
+    parser.add_argument("--random", type=int, help="number of random combinations instead of the full grid")
+    parser.add_argument("--seed", type=int, help="seed of random search")
+    parser.add_argument("-p", "--processes", type=int, default=os.cpu_count(), help="number of concurrent runs")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="TensorFlow threads per run")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    logging.basicConfig(filename=f"{args.output}/logging", filemode="a", format="%(asctime)s %(name)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S", level=logging.INFO)
+
+    with open(args.space) as stream:
+        space = json.load(stream)
+
+    combinations = grid(space) if args.random is None else random_search(space, args.random, seed=args.seed)
+    configs = write_configs(args.config, combinations, args.output)
+    results = sweep(configs, processes=args.processes, threads=args.threads)
+
+    with open(f"{args.output}/summary.json", "w") as stream:
+        json.dump(results, stream, indent=2)
+
+    table = [[i+1, *[result["parameters"][key] for key in SWEPT], f"{score(result):.6f}", result["epochs"], f"{result['samples_per_second']:.1f}"] for i, result in enumerate(results)]
+    print(tabulate(table, headers=["rank", *SWEPT, "loss", "epochs", "samples/s"]))
@@ -9,6 +9,12 @@ logging.getLogger("h5py._conv").disabled=True
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-cfg", "--config", type=str, help="configuration file path")
+    parser.add_argument("--compile", action="store_true", help="run training step as a compiled graph")
+    parser.add_argument("--xla", action="store_true", help="compile training step with XLA")
+    parser.add_argument("--benchmark", action="store_true", help="report throughput instead of saving the model, checkpoints and metrics")
+    parser.add_argument("--epochs", type=int, help="override number of epochs")
+    parser.add_argument("--resume", action="store_true", help="continue from the latest checkpoint")
+    parser.add_argument("-w", "--worker", type=int, default=0, help="index of this process in the workers list of the config")
     args = parser.parse_args()
 
     logging_file = f"{os.path.dirname(args.config)}/logging"
@@ -16,7 +22,19 @@ if __name__ == "__main__":
 
     logging.basicConfig(filename=logging_file, filemode="a", format=logging_format, datefmt="%Y-%m-%d %H:%M:%S", level=logging.DEBUG)
 
-    trainer = Trainer(config=args.config)
+    trainer = Trainer(config=args.config, worker_index=args.worker)
+    trainer.compile = trainer.compile or args.compile
+    trainer.xla = trainer.xla or args.xla
+    trainer.benchmark = args.benchmark
+    if args.epochs is not None:
+        trainer.epochs = args.epochs
+    if args.resume:
+        trainer.resume()
 
     trainer.train()
-    trainer.save()
\ No newline at end of file
+
+    if args.benchmark:
+        throughput = trainer.throughput()
+        print(f"steps/s {throughput['steps_per_second']:.1f} samples/s {throughput['samples_per_second']:.1f} s/epoch {throughput['seconds_per_epoch']:.3f}")
+    else:
+        trainer.save()
@@ -1,4 +1,29 @@
 # core package initialization
-from model import *
-from features import *
-from parser import *
\ No newline at end of file
+# submodules are imported when one of their names is first used, unknown names never import anything
+import importlib
+
+EXPORTS = {
+    "geometry": ["decode_angles", "angles_by_ss", "normalize", "place_atoms", "build_fragments"],
+    "clash": ["OFFSETS", "cell_keys", "CellList", "ClashDetector"],
+    "parser": ["RESIDUES", "PDB_FORMAT", "CarbonAlpha", "BoundCarbonAlpha", "Structure", "LineParser", "open_pdb", "SecondaryStructure", "FileParser"],
+    "writer": ["ATOM_PREFIX", "ATOM_SUFFIX", "TOPOLOGY", "atom_prefixes", "score_remarks", "write_pdb", "write_trajectory", "read_trajectory"],
+    "cache": ["DTYPE", "StructureCache"],
+    "ranking": ["TERMS", "closure_errors", "clash_counts", "window_rmsd", "parse_weights", "Ranking"],
+    "features": ["Input", "InputMLP", "Label", "LabelMLP", "Observation", "ObservationMLP", "DataSet", "DataSetMLP", "AA_CODES", "SS_CODES", "FIRST_ANGLE", "codes_table", "AA_TABLE", "SS_TABLE", "fragment_length", "encode_codes", "one_hot_array", "parse_lines", "format_inputs", "format_labels", "ss_indices", "fragment_labels", "DataSetBulkMLP", "ConversionProgress"],
+    "store": ["MANIFEST", "COLUMNS", "ss_composition", "FragmentStoreWriter", "FragmentSubset", "FragmentStore"],
+    "latent": ["MODES", "LatentSampler"],
+    "inference": ["ACTIVATIONS", "export_decoder", "NumpyDecoder", "NumpyDecoderLoader", "load_decoder"],
+    "rebuild": ["BOND_LENGTH", "fragment_label", "labels", "window", "build_candidates", "score_setup", "score_candidates", "score", "rank", "write_models", "output_path"],
+    "adaptive": ["SAMPLE_BUDGET", "RoundReport", "AdaptiveSampler"],
+    "output": ["Output", "to_degrees", "to_radians", "sin_cos_to_angle", "angles_to_cartesian", "build_fragment"],
+    "server": ["Request", "Batcher", "FragmentServer", "FragmentHandler", "FragmentClient"],
+    "sweep": ["SWEPT", "grid", "random_search", "write_configs", "limit_threads", "run", "sweep"],
+    "model": ["kl_loss", "reconstruction_loss", "displacement_loss", "latent_sample", "CVAE", "Trainer", "DecoderLoader"],
+}
+SUBMODULES = {name: submodule for submodule, names in EXPORTS.items() for name in names}
+
+
+def __getattr__(name):
+    if name not in SUBMODULES:
+        raise AttributeError(f"module 'core' has no attribute {name}")
+    return getattr(importlib.import_module(f"core.{SUBMODULES[name]}"), name)
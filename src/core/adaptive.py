@@ -0,0 +1,90 @@
+import math
+import time
+import numpy as np
+from core.ranking import Ranking
+from core.rebuild import build_candidates, score_setup, score_candidates
+
+# candidates generated in rounds until enough of them pass the clash and closure thresholds
+
+SAMPLE_BUDGET = 100 # default sample budget in multiples of the first round
+
+
+class RoundReport:
+    def __init__(self, round, generated, accepted, seconds):
+        self.round = round
+        self.generated = generated
+        self.accepted = accepted
+        self.seconds = seconds
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.generated if self.generated > 0 else 0.0
+
+
+class AdaptiveSampler:
+    def __init__(self, generate, repeats, ranking=None, closure_threshold=math.inf, round_size=1000, max_round_size=100000, max_samples=None, max_seconds=None):
+        # generate(k) returns k decoder output vectors
+        self.generate = generate
+        self.repeats = repeats
+        self.ranking = Ranking() if ranking is None else ranking
+        self.closure_threshold = closure_threshold
+        self.round_size = round_size
+        self.max_round_size = max_round_size
+        self.max_samples = SAMPLE_BUDGET * round_size if max_samples is None else max_samples
+        self.max_seconds = max_seconds
+        self.rounds = []
+        self.reason = None # why sampling stopped
+
+    def next_round_size(self, accepted, generated):
+        # enough samples to fill the missing candidates at the acceptance rate observed so far, with a margin
+        if accepted == 0:
+            size = 2 * self.rounds[-1].generated
+        else:
+            size = math.ceil(1.2 * (self.repeats - accepted) * generated / accepted)
+        size = min(size, self.max_samples - generated)
+        return max(1, min(size, self.max_round_size))
+
+    def run(self, structure, start, end):
+        start_time = time.perf_counter()
+        setup = score_setup(structure, start, end) # built once, every round is scored against it
+        detector = setup[0]
+        if len(detector.fixed_pairs) > self.ranking.max_clashes:
+            # clashes between fixed atoms count for every candidate, so none could ever pass
+            self.reason = f"{len(detector.fixed_pairs)} clashes between fixed atoms exceed the limit of {self.ranking.max_clashes}"
+            empty = np.empty((0, len(detector.window), 3))
+            return empty, score_candidates(setup, empty, self.ranking.superpose, self.ranking.threads)
+
+        pool = []
+        terms = {}
+        generated = 0
+        accepted = 0
+        size = self.round_size
+        while True:
+            round_start = time.perf_counter()
+            candidates = build_candidates(structure, start, end, self.generate(size))
+            round_terms = score_candidates(setup, candidates, self.ranking.superpose, self.ranking.threads)
+            passing = (round_terms["clashes"] <= self.ranking.max_clashes) & (round_terms["closure"] <= self.closure_threshold)
+
+            pool.append(candidates[passing])
+            for name, values in round_terms.items():
+                terms.setdefault(name, []).append(values[passing])
+            generated += size
+            accepted += int(np.count_nonzero(passing))
+            self.rounds.append(RoundReport(len(self.rounds) + 1, size, int(np.count_nonzero(passing)), time.perf_counter() - round_start))
+
+            if accepted >= self.repeats:
+                self.reason = "enough candidates accepted"
+                break
+            if generated >= self.max_samples:
+                self.reason = f"sample budget of {self.max_samples} reached"
+                break
+            if self.max_seconds is not None and time.perf_counter() - start_time >= self.max_seconds:
+                self.reason = f"time budget of {self.max_seconds} s reached"
+                break
+            size = self.next_round_size(accepted, generated)
+
+        candidates = np.concatenate(pool)
+        terms = {name: np.concatenate(values) for name, values in terms.items()}
+        # coordinates and score terms of the selected candidates
+        selected, _ = self.ranking.select(terms, self.repeats)
+        return candidates[selected], {name: values[selected] for name, values in terms.items()}
@@ -0,0 +1,30 @@
+import os
+import warnings
+import importlib
+
+# heavy backends are imported on first use, so light commands do not pay for them
+
+
+class LazyModule:
+    def __init__(self, name, setup=None):
+        self._name = name
+        self._setup = setup
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            if self._setup is not None:
+                self._setup()
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+
+def quiet_tensorflow():
+    warnings.filterwarnings("ignore")
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+
+tf = LazyModule("tensorflow", setup=quiet_tensorflow)
@@ -0,0 +1,72 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+# persistent cache of parsed alpha carbon traces
+# every structure is a single structured .npy file which is memory-mapped on reuse
+# entries are written to a temporary file and renamed, so concurrent processes never see partial files
+
+DTYPE = np.dtype([("coordinates", np.float64, (3,)), ("id", np.int64), ("residue", "U3"), ("residue_id", np.int64), ("chain_name", "U1"), ("ss", "U1")])
+
+
+class StructureCache:
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, file):
+        # path, size and modification time identify the content without reading the file
+        status = os.stat(file)
+        identity = f"{os.path.realpath(file)}:{status.st_size}:{status.st_mtime_ns}"
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, file):
+        path = self.path(self.key(file))
+        try:
+            records = np.load(path, mmap_mode="r")
+            os.utime(path) # recently used entries survive eviction
+        except (FileNotFoundError, ValueError):
+            return None
+        return records
+
+    def put(self, file, structure):
+        records = np.empty(structure.length(), dtype=DTYPE)
+        records["coordinates"] = structure.coordinates_array()
+        records["id"] = structure.ids()
+        records["residue"] = structure.residues()
+        records["residue_id"] = structure.residue_ids()
+        records["chain_name"] = structure.chain_names()
+        records["ss"] = structure.secondary_structure()
+
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as stream:
+            np.save(stream, records)
+        os.replace(temporary, self.path(self.key(file)))
+        self.evict()
+
+    def evict(self):
+        # least recently used entries are removed until the cache fits its size cap
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                status = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime_ns, status.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass # removed by another process
+            total -= size
@@ -0,0 +1,105 @@
+import numpy as np
+
+# clash detection backed by a cell list
+# atoms are hashed into cubic cells with the edge equal to the tolerance, so only atoms in the 27 neighbouring cells are compared
+
+OFFSETS = np.array([[i, j, k] for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)], dtype=np.int64)
+
+
+def cell_keys(cells):
+    # hash of integer cell coordinates, collisions only add candidates which are rejected by the distance test
+    cells = cells.astype(np.int64)
+    return (cells[..., 0] * 73856093) ^ (cells[..., 1] * 19349663) ^ (cells[..., 2] * 83492791)
+
+
+class CellList:
+    def __init__(self, coordinates, cell_size):
+        self.coordinates = np.asarray(coordinates, dtype=np.float64)
+        self.cell_size = cell_size
+        keys = cell_keys(np.floor(self.coordinates / cell_size))
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def query(self, points, radius):
+        # (query, atom) index pairs closer than radius, radius must not exceed the cell size
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        cells = np.floor(points / self.cell_size).astype(np.int64)
+        queries = []
+        atoms = []
+        for offset in OFFSETS:
+            keys = cell_keys(cells + offset)
+            low = np.searchsorted(self.keys, keys, side="left")
+            high = np.searchsorted(self.keys, keys, side="right")
+            counts = high - low
+            total = counts.sum()
+            if total == 0:
+                continue
+            query = np.repeat(np.arange(len(points)), counts)
+            position = np.repeat(low - np.cumsum(counts) + counts, counts) + np.arange(total)
+            queries.append(query)
+            atoms.append(self.order[position])
+        if not queries:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        queries = np.concatenate(queries)
+        atoms = np.concatenate(atoms)
+        distances = np.linalg.norm(points[queries] - self.coordinates[atoms], axis=1)
+        close = distances < radius
+        pairs = np.unique(np.stack([queries[close], atoms[close]], axis=1), axis=0) # hash collisions may repeat a pair
+        return pairs[:, 0], pairs[:, 1]
+
+
+class ClashDetector:
+    def __init__(self, coordinates, residue_ids, tolerance, window=None):
+        # window is an index array of atoms which are replaced by candidates, all other atoms stay fixed
+        self.coordinates = np.asarray(coordinates, dtype=np.float64)
+        self.residue_ids = np.asarray(residue_ids)
+        self.tolerance = tolerance
+        self.window = np.empty(0, dtype=np.int64) if window is None else np.asarray(window, dtype=np.int64)
+
+        fixed = np.ones(len(self.coordinates), dtype=bool)
+        fixed[self.window] = False
+        self.fixed = np.flatnonzero(fixed)
+        self.cells = CellList(self.coordinates[self.fixed], cell_size=tolerance)
+
+        # clashes between fixed atoms are the same for every candidate
+        i, j = self.cells.query(self.coordinates[self.fixed], tolerance)
+        keep = i < j
+        self.fixed_pairs = np.stack([self.fixed[i[keep]], self.fixed[j[keep]]], axis=1)
+
+    def window_pairs(self, window_coordinates):
+        # (candidate, atom, atom) clashes of one or many candidates, atoms are indices into the whole structure
+        window_coordinates = np.asarray(window_coordinates, dtype=np.float64)
+        population, n, _ = window_coordinates.shape
+
+        query, atom = self.cells.query(window_coordinates.reshape(-1, 3), self.tolerance)
+        against_fixed = np.stack([query // n, self.window[query % n], self.fixed[atom]], axis=1)
+
+        # window atoms against each other
+        distances = np.linalg.norm(window_coordinates[:, :, None, :] - window_coordinates[:, None, :, :], axis=-1)
+        candidate, i, j = np.nonzero(np.triu(distances < self.tolerance, k=1))
+        inside = np.stack([candidate, self.window[i], self.window[j]], axis=1)
+
+        return np.concatenate([against_fixed, inside])
+
+    def check_batch(self, window_coordinates):
+        # (population, n, 3) candidates -> boolean array of crossing candidates
+        population = len(window_coordinates)
+        if len(self.fixed_pairs) > 0:
+            return np.ones(population, dtype=bool)
+        crossing = np.zeros(population, dtype=bool)
+        crossing[self.window_pairs(window_coordinates)[:, 0]] = True
+        return crossing
+
+    def check(self, window_coordinates=None, info=True):
+        # [crossing, places] of a single candidate, places are sorted residue id pairs as in Structure.check_if_crossing
+        pairs = self.fixed_pairs
+        if len(self.window) > 0:
+            pairs = np.concatenate([pairs, self.window_pairs(np.asarray(window_coordinates)[None])[:, 1:]])
+        places = np.sort(self.residue_ids[pairs], axis=1) if len(pairs) > 0 else np.empty((0, 2), dtype=np.int64)
+        places = sorted(set(map(tuple, places.tolist())))
+        crossing = len(places) > 0
+        if info == True:
+            return [crossing, [list(place) for place in places]]
+        else:
+            return [crossing]
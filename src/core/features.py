@@ -1,11 +1,7 @@
-import os
-import warnings
-
-warnings.filterwarnings("ignore")
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-
-import tensorflow as tf
+import time
+import logging
 import numpy as np
+from core.backend import tf
 from typing import List
 from abc import ABC, abstractmethod
 
@@ -189,4 +185,188 @@ class DataSetMLP(DataSet):
         return tf.concat([input.format() for input in self.load_inputs()], axis=0)
 
     def labels_tensor(self):
-        return tf.concat([label.format() for label in self.load_labels()], axis=0)
\ No newline at end of file
+        return tf.concat([label.format() for label in self.load_labels()], axis=0)
+
+# column-wise conversion without per-observation tensors
+
+AA_CODES = "ARNDCQEGHILKMFPSTWYV"
+SS_CODES = "HEC"
+
+FIRST_ANGLE = 9 # index of the first angle in a split line
+
+
+def codes_table(codes):
+    # lookup table from byte value to category index, unknown bytes are marked with len(codes)
+    table = np.full(256, len(codes), dtype=np.uint8)
+    for i, code in enumerate(codes):
+        table[ord(code)] = i
+    return table
+
+
+AA_TABLE = codes_table(AA_CODES)
+SS_TABLE = codes_table(SS_CODES)
+
+
+def fragment_length(line: str):
+    # number of rebuilt residues, the sequence is padded with three residues on both sides
+    return len(line.split()[4]) - 6
+
+
+def encode_codes(strings, table, n):
+    # list of strings of equal length -> (rows, n) array of category indices
+    indices = table[np.frombuffer("".join(strings).encode("ascii"), dtype=np.uint8)].reshape(len(strings), n)
+    if np.any(indices == table.max()):
+        raise ValueError("unknown residue or secondary structure code")
+    return indices
+
+
+def one_hot_array(indices, depth):
+    # (rows, n) category indices -> (rows, n * depth), the same layout as Label.string_to_one_hot
+    rows, n = np.shape(indices)
+    one_hot = np.zeros((rows, n, depth), dtype=np.float32)
+    one_hot[np.arange(rows)[:, None], np.arange(n)[None, :], indices] = 1.0
+    return one_hot.reshape(rows, n * depth)
+
+
+def parse_lines(lines: List[str], n):
+    # split every line once and gather its columns
+    rows = len(lines)
+    aa = []
+    ss = []
+    displacement = []
+    angles = []
+    for line in lines:
+        elements = line.split()
+        if len(elements) != FIRST_ANGLE + 2 * n or len(elements[4]) != n + 6:
+            raise ValueError(f"line does not describe a fragment of length {n}: {line.strip()}")
+        aa.append(elements[4][3:-3])
+        ss.append(elements[5][3:-3])
+        displacement.extend(elements[6:FIRST_ANGLE])
+        angles.extend(elements[FIRST_ANGLE:])
+
+    columns = {
+        "aa": encode_codes(aa, AA_TABLE, n),
+        "ss": encode_codes(ss, SS_TABLE, n),
+        "displacement": np.array(displacement, dtype=np.float64).astype(np.float32).reshape(rows, 3),
+        "angles": np.array(angles, dtype=np.float64).astype(np.float32).reshape(rows, 2 * n),
+    }
+    return columns
+
+
+def format_inputs(alpha, theta):
+    # vectorized InputMLP.format
+    radians = theta * np.float32(np.pi) / np.float32(180)
+    return np.concatenate([alpha / np.float32(180), np.sin(radians), np.cos(radians)], axis=1).astype(np.float32)
+
+
+def format_labels(displacement, aa, ss):
+    # vectorized LabelMLP.format
+    return np.concatenate([displacement, one_hot_array(aa, len(AA_CODES)), one_hot_array(ss, len(SS_CODES))], axis=1).astype(np.float32)
+
+
+def ss_indices(labels):
+    # (rows, label_dim) labels -> (rows, n) secondary structure indices, vectorized LabelMLP.extract_ss
+    labels = np.asarray(labels)
+    n = (labels.shape[1] - 3) // 23
+    return np.argmax(labels[:, 3 + 20 * n:].reshape(-1, n, len(SS_CODES)), axis=2)
+
+
+def fragment_labels(aa, ss, dx, dy, dz, population):
+    # population copies of a single LabelMLP.format row
+    n = len(aa)
+    displacement = np.tile(np.array([[dx, dy, dz]], dtype=np.float32), (population, 1))
+    aa = np.repeat(encode_codes([aa], AA_TABLE, n), population, axis=0)
+    ss = np.repeat(encode_codes([ss], SS_TABLE, n), population, axis=0)
+    return format_labels(displacement=displacement, aa=aa, ss=ss)
+
+
+class DataSetBulkMLP:
+    def __init__(self, file, chunk_size=100000):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.rows, self.n = self.scan()
+
+    @property
+    def input_dim(self):
+        return 3 * self.n
+
+    @property
+    def label_dim(self):
+        return (20 + 3) * self.n + 3
+
+    def scan(self):
+        # count observations and read fragment length without keeping lines in memory
+        rows = 0
+        n = None
+        with open(self.file) as stream:
+            for line in stream:
+                if not line.strip():
+                    continue
+                if n is None:
+                    n = fragment_length(line)
+                rows += 1
+        if n is None:
+            raise ValueError(f"no observations in {self.file}")
+        return rows, n
+
+    def chunks(self):
+        # yield lists of at most chunk_size non-empty lines
+        with open(self.file) as stream:
+            lines = []
+            for line in stream:
+                if not line.strip():
+                    continue
+                lines.append(line)
+                if len(lines) == self.chunk_size:
+                    yield lines
+                    lines = []
+            if lines:
+                yield lines
+
+    def convert_chunk(self, lines):
+        columns = parse_lines(lines, self.n)
+        angles = columns["angles"]
+        inputs = format_inputs(alpha=angles[:, 0::2], theta=angles[:, 1::2])
+        labels = format_labels(displacement=columns["displacement"], aa=columns["aa"], ss=columns["ss"])
+        return inputs, labels
+
+    def fill(self, inputs, labels, progress=None):
+        # write converted chunks into preallocated arrays
+        start = 0
+        for lines in self.chunks():
+            end = start + len(lines)
+            inputs[start:end], labels[start:end] = self.convert_chunk(lines)
+            start = end
+            if progress is not None:
+                progress.update(end)
+        return inputs, labels
+
+    def load_arrays(self):
+        inputs = np.empty((self.rows, self.input_dim), dtype=np.float32)
+        labels = np.empty((self.rows, self.label_dim), dtype=np.float32)
+        return self.fill(inputs, labels)
+
+    def save(self, inputs_file, labels_file):
+        inputs, labels = self.load_arrays()
+        np.save(inputs_file, inputs)
+        np.save(labels_file, labels)
+
+    def stream(self, inputs_file, labels_file):
+        # chunks are written straight into memory-mapped .npy files, so peak memory depends on chunk size only
+        inputs = np.lib.format.open_memmap(inputs_file, mode="w+", dtype=np.float32, shape=(self.rows, self.input_dim))
+        labels = np.lib.format.open_memmap(labels_file, mode="w+", dtype=np.float32, shape=(self.rows, self.label_dim))
+        self.fill(inputs, labels, progress=ConversionProgress(total=self.rows))
+        inputs.flush()
+        labels.flush()
+        del inputs, labels
+
+
+class ConversionProgress:
+    def __init__(self, total):
+        self.total = total
+        self.start = time.perf_counter()
+
+    def update(self, rows):
+        elapsed = time.perf_counter() - self.start
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        logging.info(f"Converted {rows}/{self.total} rows ({100 * rows / self.total:.1f}%) {rate:.0f} rows/s")
@@ -0,0 +1,50 @@
+import numpy as np
+
+# vectorized chain geometry over whole populations of decoder outputs
+
+
+def decode_angles(vectors):
+    # (population, 3n) decoder outputs -> alpha and theta in degrees, both (population, n), as Output.alpha/Output.theta
+    vectors = np.asarray(vectors, dtype=np.float64)
+    n = vectors.shape[1] // 3
+    alpha = vectors[:, :n] * 180.0
+    theta = np.degrees(np.arctan2(vectors[:, n:2*n], vectors[:, 2*n:3*n]))
+    return alpha, theta
+
+
+def angles_by_ss(alpha, theta, ss, codes="HEC"):
+    # (rows, n) angles and SS indices -> {code: (k, 2) alpha/theta pairs}, residues in row-major order
+    return {code: np.stack([alpha[ss == i], theta[ss == i]], axis=1) for i, code in enumerate(codes)}
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def place_atoms(atom_1, atom_2, atom_3, bond_length, alpha, theta):
+    # angles_to_cartesian for (population, 3) atoms and (population,) angles
+    alpha = np.radians(alpha)[:, None]
+    theta = np.radians(theta)[:, None]
+    x = bond_length * np.cos(alpha)
+    y = bond_length * np.sin(alpha) * np.cos(theta)
+    z = bond_length * np.sin(alpha) * np.sin(theta)
+
+    v_12 = atom_2 - atom_1
+    v_23 = normalize(atom_3 - atom_2)
+    k = normalize(np.cross(v_12, v_23))
+    l = np.cross(k, v_23)
+    return atom_3 - v_23 * x + l * y + k * z
+
+
+def build_fragments(c_1, c_2, c_3, vectors, bond_length):
+    # NeRF chain growth of every candidate at once, (population, 3n) outputs -> (population, n, 3) coordinates
+    alpha, theta = decode_angles(vectors)
+    population, n = alpha.shape
+
+    atoms = np.empty((population, n + 3, 3))
+    atoms[:, 0] = np.asarray(c_1, dtype=np.float64)
+    atoms[:, 1] = np.asarray(c_2, dtype=np.float64)
+    atoms[:, 2] = np.asarray(c_3, dtype=np.float64)
+    for i in range(n):
+        atoms[:, i+3] = place_atoms(atoms[:, i], atoms[:, i+1], atoms[:, i+2], bond_length, alpha[:, i], theta[:, i])
+    return atoms[:, 3:]
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+from core.latent import LatentSampler
+
+# TensorFlow-free decoder inference
+# dense layers of the trained decoder are exported to decoder.npz and evaluated with NumPy
+
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0.0),
+    "linear": lambda x: x,
+}
+
+
+def export_decoder(decoder, file):
+    # keras Sequential of Dense layers -> kernel_i, bias_i and activation_i arrays
+    arrays = {}
+    for i, layer in enumerate(decoder.layers):
+        kernel, bias = layer.get_weights()
+        arrays[f"kernel_{i}"] = kernel.astype(np.float32)
+        arrays[f"bias_{i}"] = bias.astype(np.float32)
+        arrays[f"activation_{i}"] = np.array(layer.get_config()["activation"])
+    np.savez(file, layers=np.array(len(decoder.layers)), **arrays)
+
+
+class NumpyDecoder:
+    def __init__(self, file):
+        self.file = file
+        with np.load(file) as arrays:
+            self.layers = []
+            for i in range(int(arrays["layers"])):
+                activation = str(arrays[f"activation_{i}"])
+                if activation not in ACTIVATIONS:
+                    raise ValueError(f"unsupported activation {activation} in {file}")
+                self.layers.append((arrays[f"kernel_{i}"], arrays[f"bias_{i}"], ACTIVATIONS[activation]))
+
+    def predict(self, data):
+        x = np.asarray(data, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+
+class NumpyDecoderLoader:
+    def __init__(self, decoder, latent, sampling="empirical", seed=None):
+        self.decoder = NumpyDecoder(decoder)
+        self.sampler = LatentSampler(latent, mode=sampling, seed=seed)
+
+    def predict(self, labels):
+        z = self.sampler.sample(len(labels))
+        return self.decoder.predict(np.concatenate([z, np.asarray(labels, dtype=np.float32)], axis=1))
+
+
+def load_decoder(model, engine="auto", sampling="empirical", seed=None):
+    # NumPy engine is used whenever decoder.npz exists, unless TensorFlow is requested explicitly
+    exported = f"{model}/decoder.npz"
+    if engine == "numpy" or (engine == "auto" and os.path.exists(exported)):
+        return NumpyDecoderLoader(decoder=exported, latent=f"{model}/latent.npy", sampling=sampling, seed=seed)
+    from core.model import DecoderLoader
+    return DecoderLoader(decoder=f"{model}/decoder.pb", latent=f"{model}/latent.npy", sampling=sampling, seed=seed)
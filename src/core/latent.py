@@ -0,0 +1,65 @@
+import numpy as np
+
+# sampling of latent vectors fed to the decoder
+# latent.npy holds (mean, log_variance) of every training observation as a (2, N, latent_dim) array, or means only as (1, N, latent_dim)
+
+MODES = ["empirical", "posterior", "gaussian", "prior"]
+
+
+class LatentSampler:
+    def __init__(self, file, mode="empirical", seed=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown sampling mode {mode}, expected one of {MODES}")
+        self.file = file
+        self.mode = mode
+        self.generator = np.random.default_rng(seed)
+
+        self.latent = np.load(file, mmap_mode="r") # rows are read only when drawn
+        self.means = self.latent[0]
+        self.log_variances = self.latent[1] if len(self.latent) > 1 else None
+        if mode == "posterior" and self.log_variances is None:
+            raise ValueError(f"{file} holds means only, posterior sampling needs log variances")
+
+        if mode == "gaussian":
+            self.center, self.scale = self.fit()
+
+    @property
+    def latent_dim(self):
+        return self.means.shape[1]
+
+    def fit(self, chunk_size=100000):
+        # diagonal Gaussian fitted to the means, accumulated chunk by chunk
+        total = np.zeros(self.latent_dim)
+        squares = np.zeros(self.latent_dim)
+        rows = len(self.means)
+        for start in range(0, rows, chunk_size):
+            chunk = np.asarray(self.means[start:start+chunk_size], dtype=np.float64)
+            total += chunk.sum(axis=0)
+            squares += np.square(chunk).sum(axis=0)
+        center = total / rows
+        scale = np.sqrt(np.maximum(squares / rows - np.square(center), 0.0))
+        return center, scale
+
+    def gather(self, array, indices):
+        # sorted reads from the memory-mapped file, then back to the drawn order
+        order = np.argsort(indices)
+        rows = np.empty((len(indices), array.shape[1]), dtype=np.float32)
+        rows[order] = array[indices[order]]
+        return rows
+
+    def indices(self, k):
+        return self.generator.integers(0, len(self.means), size=k)
+
+    def sample(self, k):
+        if self.mode == "prior":
+            return self.generator.standard_normal((k, self.latent_dim)).astype(np.float32)
+        if self.mode == "gaussian":
+            return (self.center + self.scale * self.generator.standard_normal((k, self.latent_dim))).astype(np.float32)
+
+        indices = self.indices(k)
+        means = self.gather(self.means, indices)
+        if self.mode == "empirical":
+            return means
+        log_variances = self.gather(self.log_variances, indices)
+        epsilon = self.generator.standard_normal((k, self.latent_dim)).astype(np.float32)
+        return means + np.exp(0.5 * log_variances) * epsilon
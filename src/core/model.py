@@ -1,14 +1,16 @@
 import os
 import json
-import random
+import time
 import logging
-import warnings
+import numpy as np
+from core.backend import quiet_tensorflow
 
-warnings.filterwarnings("ignore")
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
+quiet_tensorflow()
 
-import tensorflow as tf
-import numpy as np
+import tensorflow as tf # CVAE subclasses keras.Model, so this module always needs the backend
+from core.store import FragmentStore
+from core.latent import LatentSampler
+from core.inference import export_decoder
 
 
 def kl_loss(mean, log_variance):
@@ -68,12 +70,24 @@ class CVAE(tf.keras.Model):
 
 
 class Trainer:
-    def __init__(self, config):
+    def __init__(self, config, worker_index=0):
         self.config = config
+        self.worker_index = worker_index
         self.read_parameters()
         self.load_data()
 
-        self.model = CVAE(n=self.n, latent_dim=self.latent_dim, encoder_h=self.encoder_h, decoder_h=self.decoder_h)
+        self.strategy = self.distribution_strategy()
+        with self.strategy.scope():
+            self.model = CVAE(n=self.n, latent_dim=self.latent_dim, encoder_h=self.encoder_h, decoder_h=self.decoder_h)
+            self.optimizer = tf.keras.optimizers.Adam(learning_rate=self.learning_rate) # state is kept between epochs
+            self.epoch = tf.Variable(0, trainable=False, dtype=tf.int64) # completed epochs
+            self.best = tf.Variable(np.inf, trainable=False, dtype=tf.float64) # best monitored loss so far
+            self.waiting = tf.Variable(0, trainable=False, dtype=tf.int64) # epochs without improvement
+        self.history = [] # per-epoch metrics
+        self.benchmark = False # no checkpoints or metrics files are written, so timed epochs contain no extra I/O
+
+        self.checkpoint = tf.train.Checkpoint(model=self.model, optimizer=self.optimizer, epoch=self.epoch, best=self.best, waiting=self.waiting)
+        self.checkpoint_manager = tf.train.CheckpointManager(self.checkpoint, directory=f"{self.work_directory}/checkpoints", max_to_keep=3)
 
         logging.info(f"Trainer initiated from {self.config}")
 
@@ -87,20 +101,66 @@ class Trainer:
         self.latent_dim = parameters["latent_dim"]
         self.observations = parameters["observations"]
         self.learning_rate = parameters["learning_rate"]
-        self.inputs = parameters["inputs"]
-        self.labels = parameters["labels"]
+        self.inputs = parameters.get("inputs")
+        self.labels = parameters.get("labels")
         self.epochs = parameters["epochs"]
         self.batch = parameters["batch"]
         self.beta = parameters["beta"]
+        self.store = parameters.get("store") # optional sharded fragment store used instead of inputs/labels
+        self.selection = parameters.get("selection", {}) # SS fraction ranges, e.g. {"helix": [0.5, 1.0]}
+        self.shuffle_buffer = parameters.get("shuffle_buffer") # whole data set by default
+        self.compile = parameters.get("compile", False) # graph-compiled training step
+        self.xla = parameters.get("xla", False)
+        self.replicas = parameters.get("replicas", 1) # local CPU devices sharing each batch
+        self.workers = parameters.get("workers", []) # "host:port" addresses of training processes
+        self.validation = parameters.get("validation", 0.0) # held-out fraction used for early stopping
+        self.patience = parameters.get("patience") # epochs without improvement before stopping
+        self.min_delta = parameters.get("min_delta", 0.0)
+        self.checkpoint_every = parameters.get("checkpoint_every", 1) # epochs between checkpoints
+        self.latent_batch = parameters.get("latent_batch", 10000) # rows encoded at once when exporting latent space
+        self.latent_means_only = parameters.get("latent_means_only", False)
 
         config_file.close()
 
+    def distribution_strategy(self):
+        if self.workers:
+            # every worker runs the same config with its own index
+            cluster = {"cluster": {"worker": self.workers}, "task": {"type": "worker", "index": self.worker_index}}
+            os.environ["TF_CONFIG"] = json.dumps(cluster)
+            return tf.distribute.MultiWorkerMirroredStrategy()
+        if self.replicas > 1:
+            cpu = tf.config.list_physical_devices("CPU")[0]
+            tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration() for _ in range(self.replicas)])
+            return tf.distribute.MirroredStrategy(devices=[f"/cpu:{i}" for i in range(self.replicas)])
+        return tf.distribute.get_strategy()
+
+    @property
+    def chief(self):
+        return self.worker_index == 0
+
+    @property
+    def work_directory(self):
+        # other workers write their copies aside, so they do not overwrite the chief
+        work_directory = os.path.dirname(self.config)
+        return work_directory if self.chief else f"{work_directory}/worker_{self.worker_index}"
+
     def load_data(self):
-        inputs = np.load(self.inputs)
-        labels = np.load(self.labels)
+        if self.store is not None:
+            subset = FragmentStore(self.store).select(self.n, **self.selection)
+            inputs = subset.inputs()
+            labels = subset.labels()
+        else:
+            inputs = np.load(self.inputs, mmap_mode="r") # batches are read on demand
+            labels = np.load(self.labels, mmap_mode="r")
         
+        observations = len(inputs[:self.observations]) # a selected subset may be smaller than requested
+        held_out = int(observations * self.validation)
+        self.observations = observations - held_out
+
         self.training_inputs = inputs[:self.observations]
         self.training_labels = labels[:self.observations]
+        self.validation_inputs = inputs[self.observations:observations]
+        self.validation_labels = labels[self.observations:observations]
 
     def losses(self, inputs, labels):
         # pass data through the network
@@ -115,37 +175,154 @@ class Trainer:
 
         return total, reconstruction, kl
 
-    def train(self):
-        for epoch in range(self.epochs):
-            # data shuffling before each epoch
-            indices = tf.random.shuffle(tf.range(0, self.observations, dtype=tf.int32))
-            training_inputs = tf.gather(self.training_inputs, indices)
-            training_labels = tf.gather(self.training_labels, indices)
-
-            optimizer = tf.keras.optimizers.Adam(learning_rate=self.learning_rate)
+    def dataset(self):
+        # only indices are shuffled, batches are gathered from the source arrays by parallel workers
+        inputs = self.training_inputs
+        labels = self.training_labels
+
+        def gather(indices):
+            indices = np.sort(indices) # sequential reads from memory-mapped files
+            return inputs[indices].astype(np.float32), labels[indices].astype(np.float32)
+
+        def load(indices):
+            batch_inputs, batch_labels = tf.numpy_function(gather, [indices], [tf.float32, tf.float32])
+            batch_inputs.set_shape([self.batch, self.model.input_dim])
+            batch_labels.set_shape([self.batch, self.model.label_dim])
+            return batch_inputs, batch_labels
+
+        buffer = self.observations if self.shuffle_buffer is None else self.shuffle_buffer
+        dataset = tf.data.Dataset.range(self.observations)
+        dataset = dataset.shuffle(buffer, reshuffle_each_iteration=True)
+        dataset = dataset.batch(self.batch, drop_remainder=True)
+        dataset = dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def train_step(self, inputs, labels):
+        with tf.GradientTape() as tape:
+            total, reconstruction, kl = self.losses(inputs, labels)
+            # gradients are summed over replicas
+            scaled = total / tf.distribute.get_strategy().num_replicas_in_sync
+
+        # update trainable parameters
+        grads = tape.gradient(scaled, self.model.trainable_weights)
+        self.optimizer.apply_gradients(zip(grads, self.model.trainable_weights))
+        return total, reconstruction, kl
 
-            steps = int(self.observations / self.batch)
-            for step in range(steps):
-                start = int(step * self.batch)
-                end = int(start + self.batch)
-                batch_inputs = training_inputs[start:end]
-                batch_labels = training_labels[start:end]
+    def distributed_step(self, inputs, labels):
+        losses = self.strategy.run(self.train_step, args=(inputs, labels))
+        return [self.strategy.reduce(tf.distribute.ReduceOp.MEAN, loss, axis=None) for loss in losses]
+
+    def step_function(self):
+        distributed = self.strategy.num_replicas_in_sync > 1
+        step = self.distributed_step if distributed else self.train_step
+        if self.compile or self.xla or distributed:
+            return tf.function(step, jit_compile=self.xla)
+        return step
+
+    def evaluate(self):
+        # losses averaged over the held-out split
+        sums = np.zeros(3)
+        for start in range(0, len(self.validation_inputs), self.batch):
+            inputs = np.asarray(self.validation_inputs[start:start+self.batch], dtype=np.float32)
+            labels = np.asarray(self.validation_labels[start:start+self.batch], dtype=np.float32)
+            sums += len(inputs) * np.array([float(loss) for loss in self.losses(inputs, labels)])
+        return sums / len(self.validation_inputs)
+
+    def resume(self):
+        # restore model, optimizer, epoch counter and early stopping state from the latest checkpoint
+        if self.checkpoint_manager.latest_checkpoint is None:
+            logging.info("No checkpoint found, training from scratch")
+            self.truncate_metrics()
+            return False
+        self.checkpoint.restore(self.checkpoint_manager.latest_checkpoint)
+        logging.info(f"Resumed from {self.checkpoint_manager.latest_checkpoint} after epoch {int(self.epoch.numpy())}")
+        self.truncate_metrics()
+        return True
+
+    def truncate_metrics(self):
+        # epochs after the restored checkpoint are trained again, their old records are dropped
+        file = f"{self.work_directory}/metrics.jsonl"
+        if not self.chief or not os.path.exists(file):
+            return
+        with open(file) as stream:
+            lines = [line for line in stream if line.strip() and json.loads(line)["epoch"] <= int(self.epoch.numpy())]
+        with open(file, "w") as stream:
+            stream.writelines(lines)
+
+    def write_metrics(self, metrics):
+        if not self.chief or self.benchmark:
+            return
+        with open(f"{self.work_directory}/metrics.jsonl", "a") as stream:
+            stream.write(json.dumps(metrics) + "\n")
 
-                with tf.GradientTape() as tape:
-                    total, reconstruction, kl = self.losses(batch_inputs, batch_labels)
+    def train(self):
+        dataset = self.dataset()
+        if self.strategy.num_replicas_in_sync > 1:
+            dataset = self.strategy.experimental_distribute_dataset(dataset) # global batch is split between replicas
+        train_step = self.step_function()
+
+        for epoch in range(int(self.epoch.numpy()), self.epochs):
+            start = time.perf_counter()
+            steps = 0
+            sums = [0.0, 0.0, 0.0]
+            for batch_inputs, batch_labels in dataset:
+                losses = train_step(batch_inputs, batch_labels)
+                sums = [value + loss for value, loss in zip(sums, losses)]
+                steps += 1
+            seconds = time.perf_counter() - start
+            total, reconstruction, kl = [float(value) / max(steps, 1) for value in sums]
+            self.epoch.assign(epoch + 1)
+
+            metrics = {"epoch": epoch + 1, "steps": steps, "samples": steps * self.batch, "seconds": seconds,
+                       "samples_per_second": steps * self.batch / seconds if seconds > 0 else 0.0,
+                       "total": total, "reconstruction": reconstruction, "kl": kl}
+            training_message = f"total {total:.6f} reconstruction {reconstruction:.6f} kl {kl:.6f}"
 
-                # update trainable parameters
-                grads = tape.gradient(total, self.model.trainable_weights)
-                optimizer.apply_gradients(zip(grads, self.model.trainable_weights))
+            monitored = total
+            if len(self.validation_inputs) > 0:
+                metrics["validation_total"], metrics["validation_reconstruction"], metrics["validation_kl"] = self.evaluate()
+                monitored = metrics["validation_total"]
+                training_message += f" validation {monitored:.6f}"
 
-            training_message = f"total {total:.6f} reconstruction {reconstruction:.6f} kl {kl:.6f}"
-            
+            self.history.append(metrics)
+            self.write_metrics(metrics)
             logging.info(f"Epoch {epoch+1}/{self.epochs}" + " " + training_message)
+
+            stop = False
+            if not np.isfinite(monitored):
+                logging.info("Training diverged, stopping")
+                stop = True
+            elif monitored < float(self.best.numpy()) - self.min_delta:
+                self.best.assign(monitored)
+                self.waiting.assign(0)
+            else:
+                self.waiting.assign_add(1)
+                if self.patience is not None and int(self.waiting.numpy()) >= self.patience:
+                    logging.info(f"No improvement for {int(self.waiting.numpy())} epochs, stopping")
+                    stop = True
+
+            if not self.benchmark and (stop or (epoch + 1) % self.checkpoint_every == 0 or epoch + 1 == self.epochs):
+                self.checkpoint_manager.save(checkpoint_number=epoch + 1)
+            if stop:
+                break
         
         logging.info("Fitting completed")
 
+    def throughput(self, skip=1):
+        # steps/s, samples/s and mean epoch time, the first epochs include tracing and warm-up
+        epochs = self.history[skip:] if len(self.history) > skip else self.history
+        seconds = sum(epoch["seconds"] for epoch in epochs)
+        steps = sum(epoch["steps"] for epoch in epochs)
+        samples = sum(epoch["samples"] for epoch in epochs)
+        return {
+            "steps_per_second": steps / seconds if seconds > 0 else 0.0,
+            "samples_per_second": samples / seconds if seconds > 0 else 0.0,
+            "seconds_per_epoch": seconds / len(epochs) if epochs else 0.0,
+        }
+
     def save(self):
-        work_directory = os.path.dirname(self.config)
+        work_directory = self.work_directory
+        os.makedirs(work_directory, exist_ok=True)
         
         self.model.encoder.save(f"{work_directory}/encoder.pb")
         self.model.decoder.save(f"{work_directory}/decoder.pb")
@@ -155,20 +332,36 @@ class Trainer:
         
         self.model.encoder.save_weights(f"{work_directory}/encoder_weights.h5")
         self.model.decoder.save_weights(f"{work_directory}/decoder_weights.h5")
+        export_decoder(self.model.decoder, f"{work_directory}/decoder.npz") # weights for TensorFlow-free inference
 
         # latent space variables
-        np.save(f"{work_directory}/latent.npy", self.model.encode(self.training_inputs, self.training_labels))
+        self.export_latent(f"{work_directory}/latent.npy")
+
+    def export_latent(self, file):
+        # (mean, log_variance) written batch by batch into a memory-mapped (2, N, latent_dim) array
+        # only means are kept as (1, N, latent_dim) when requested, DecoderLoader reads the first entry in both cases
+        parts = 1 if self.latent_means_only else 2
+        latent = np.lib.format.open_memmap(file, mode="w+", dtype=np.float32, shape=(parts, self.observations, self.latent_dim))
+        for start in range(0, self.observations, self.latent_batch):
+            end = min(start + self.latent_batch, self.observations)
+            inputs = np.asarray(self.training_inputs[start:end], dtype=np.float32)
+            labels = np.asarray(self.training_labels[start:end], dtype=np.float32)
+            encoded = self.model.encode(inputs, labels)
+            for i in range(parts):
+                latent[i, start:end] = encoded[i].numpy()
+        latent.flush()
+        del latent
     
 
 class DecoderLoader:
-    def __init__(self, decoder, latent):
+    def __init__(self, decoder, latent, sampling="empirical", seed=None):
         self.decoder = decoder
         self.latent = latent
         
         self.decoder = tf.keras.models.load_model(self.decoder)
 
-        self.latent = np.load(self.latent)[0] # load samples from the latent space
+        self.sampler = LatentSampler(self.latent, mode=sampling, seed=seed)
 
     def predict(self, labels):
-        z = np.array(random.choices(list(self.latent), k=len(labels)))
-        return self.decoder.predict(tf.keras.layers.concatenate([z, labels]))
\ No newline at end of file
+        z = self.sampler.sample(len(labels))
+        return self.decoder.predict(np.concatenate([z, np.asarray(labels, dtype=np.float32)], axis=1))
@@ -1,5 +1,5 @@
 import math 
-import tensorflow as tf 
+from core.backend import tf
 
 
 class Output:
@@ -1,11 +1,16 @@
+import gzip
+import numpy as np
 from typing import List
-from structural import Vec3, two_atoms_vector
+from structural import Vec3
+from core.clash import ClashDetector
 
 # tools for reading PDB files
 # functionalities are dedicated to parse alpha carbon trace including secondary structure
 
 RESIDUES = {"ALA": "A", "ARG": "R", "ASN": "N", "ASP": "D", "CYS": "C", "GLN": "Q", "GLU": "E", "GLY": "G", "HIS": "H", "ILE": "I", "LEU": "L", "LYS": "K", "MET": "M", "PHE": "F", "PRO": "P", "SER": "S", "THR": "T", "TRP": "W", "TYR": "Y", "VAL": "V"}
 
+PDB_FORMAT = "%4s %6d %3s %4s %s %3d %11.3f %7.3f %7.3f %5.2f %5.2f %11s"
+
 
 class CarbonAlpha:
     def __init__(self, ss, id, residue, residue_id, chain_name, coordinates: Vec3):
@@ -18,7 +23,7 @@ class CarbonAlpha:
 
     def __str__(self):
         formatters = ("ATOM", self.id, "CA", self.residue, self.chain_name, self.residue_id, self.x, self.y, self.z, 1.00, 0.00, "C") 
-        return "%4s %6d %3s %4s %s %3d %11.3f %7.3f %7.3f %5.2f %5.2f %11s" % formatters
+        return PDB_FORMAT % formatters
     
     def __lt__(self, other):
         return self.residue_id < other.residue_id 
@@ -67,64 +72,113 @@ class CarbonAlpha:
         self._coordinates = vector
 
 
+class BoundCarbonAlpha(CarbonAlpha):
+    # atom of a Structure, coordinates are read from and written to the arrays of the structure
+    def __init__(self, structure, i):
+        super().__init__(ss=str(structure._ss[i]), id=int(structure._ids[i]), residue=str(structure._residues[i]), residue_id=int(structure._residue_ids[i]), chain_name=str(structure._chain_names[i]), coordinates=None)
+        self._structure = structure
+        self._i = i
+
+    @property
+    def coordinates(self):
+        x, y, z = self._structure._coordinates[self._i].tolist()
+        return Vec3(x=x, y=y, z=z)
+
+    @coordinates.setter
+    def coordinates(self, vector: Vec3):
+        self._structure._coordinates[self._i] = [vector.x, vector.y, vector.z]
+
+
 class Structure:
+    # residues are kept as arrays, atoms are created only when requested and write coordinate changes back
     def __init__(self, atoms: List[CarbonAlpha]):
-        self._atoms = atoms 
-    
+        self._set_arrays(
+            coordinates=[[atom.x, atom.y, atom.z] for atom in atoms],
+            ids=[atom.id for atom in atoms],
+            residues=[atom.residue for atom in atoms],
+            residue_ids=[atom.residue_id for atom in atoms],
+            chain_names=[atom.chain_name for atom in atoms],
+            ss=[atom.ss for atom in atoms],
+        )
+        self._atoms = None
+
+    @classmethod
+    def from_arrays(cls, coordinates, ids, residues, residue_ids, chain_names, ss):
+        structure = cls.__new__(cls)
+        structure._set_arrays(coordinates, ids, residues, residue_ids, chain_names, ss)
+        structure._atoms = None
+        return structure
+
+    def _set_arrays(self, coordinates, ids, residues, residue_ids, chain_names, ss):
+        self._coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 3)
+        self._ids = np.asarray(ids, dtype=np.int64)
+        self._residues = np.asarray(residues, dtype="U3")
+        self._residue_ids = np.asarray(residue_ids, dtype=np.int64)
+        self._chain_names = np.asarray(chain_names, dtype="U1")
+        self._ss = np.asarray(ss, dtype="U1")
+        self._index = {} # residue id -> position, the first occurrence wins as in a linear scan
+        for i, residue_id in enumerate(self._residue_ids.tolist()):
+            self._index.setdefault(residue_id, i)
+
     @property
     def atoms(self):
+        if self._atoms is None:
+            self._atoms = [self.atom(i) for i in range(self.length())]
         return self._atoms
+
+    def atom(self, i):
+        return BoundCarbonAlpha(self, i)
     
     def length(self):
-        return len(self.atoms)
+        return len(self._residue_ids)
     
     def coordinates(self):
         # get list of coordinates of all atoms
-        return [atom.coordinates for atom in self.atoms]
-    
+        return [Vec3(x=x, y=y, z=z) for x, y, z in self._coordinates.tolist()]
+
+    def coordinates_array(self):
+        return self._coordinates
+
+    def ids(self):
+        return self._ids
+
+    def residues(self):
+        return self._residues
+
+    def residue_ids(self):
+        return self._residue_ids
+
+    def chain_names(self):
+        return self._chain_names
+
+    def secondary_structure(self):
+        return self._ss
+
+    def with_coordinates(self, indices, coordinates):
+        # copy of the structure with coordinates of given atoms replaced
+        new_coordinates = self._coordinates.copy()
+        new_coordinates[indices] = coordinates
+        return Structure.from_arrays(new_coordinates, self._ids, self._residues, self._residue_ids, self._chain_names, self._ss)
+
     def check_if_crossing(self, tolerance, info=True):
-        places = []
-        crossing = False
-        for i in range(self.length()):
-            for j in range(i, self.length()):
-                distance = self.local_displacement(i+1, j+1).length()
-                if i != j and distance < tolerance:
-                    crossing = True
-                    places.append([i+1, j+1])
-        
-        if info == True:
-            return [crossing, places]
-        else:
-            return [crossing]
+        # pairs of residues closer than tolerance, found through a cell list
+        return ClashDetector(self._coordinates, self._residue_ids, tolerance).check(info=info)
 
     def find_residue(self, residue_id):
-        for atom in self.atoms:
-            if atom.residue_id == residue_id:
-                return self.atoms.index(atom)
-            else:
-                continue
+        return self._index.get(residue_id)
 
     def read_sequence(self, i, j):
-        string = ""
-        atoms = self.atoms[self.find_residue(i):self.find_residue(j)+1]
-        for atom in atoms:
-            string += RESIDUES[atom.residue]
-        return string 
+        return "".join(RESIDUES[residue] for residue in self._residues[self.find_residue(i):self.find_residue(j)+1].tolist())
     
     def read_secondary_structure(self, i, j):
-        string = ""
-        atoms = self.atoms[self.find_residue(i):self.find_residue(j)+1]
-        for atom in atoms:
-            string += atom.ss
-        return string 
+        return "".join(self._ss[self.find_residue(i):self.find_residue(j)+1].tolist())
     
     def local_displacement(self, i, j):
-        coordinates_i = self.atoms[self.find_residue(i)].coordinates
-        coordinates_j = self.atoms[self.find_residue(j)].coordinates
-        return two_atoms_vector(coordinates_i, coordinates_j)
+        x, y, z = (self._coordinates[self.find_residue(j)] - self._coordinates[self.find_residue(i)]).tolist()
+        return Vec3(x=x, y=y, z=z)
     
     def to_pdb(self):
-        return [atom.__str__() for atom in self.atoms]
+        return [PDB_FORMAT % ("ATOM", id, "CA", residue, chain_name, residue_id, x, y, z, 1.00, 0.00, "C") for id, residue, chain_name, residue_id, (x, y, z) in zip(self._ids.tolist(), self._residues.tolist(), self._chain_names.tolist(), self._residue_ids.tolist(), self._coordinates.tolist())]
     
 
 class LineParser:
@@ -170,83 +224,94 @@ class LineParser:
         return float(self.line[ORDINAL_START:ORDINAL_END].strip())
     
 
+def open_pdb(file):
+    # plain or gzipped PDB file opened as text
+    with open(file, "rb") as stream:
+        compressed = stream.read(2) == b"\x1f\x8b"
+    if compressed:
+        return gzip.open(file, "rt")
+    return open(file)
+
+
+class SecondaryStructure:
+    # residues covered by HELIX and SHEET records, keyed by chain and residue number
+    # insertion codes restrict only the boundary residues of a range
+    def __init__(self):
+        self.residues = {}
+
+    def add(self, code, chain_name, initial_residue_id, initial_insertion, terminal_residue_id, terminal_insertion):
+        for residue_id in range(initial_residue_id, terminal_residue_id+1):
+            low = initial_insertion if residue_id == initial_residue_id else " "
+            high = terminal_insertion if residue_id == terminal_residue_id else "~"
+            self.residues.setdefault((chain_name, residue_id), []).append((code, low, high))
+
+    def add_helix(self, line):
+        self.add("H", line[19], int(line[21:25]), line[25], int(line[33:37]), line[37])
+
+    def add_sheet(self, line):
+        self.add("E", line[21], int(line[22:26]), line[26], int(line[33:37]), line[37])
+
+    def lookup(self, chain_name, residue_id, insertion=" "):
+        # helix wins when a residue is listed in both record types
+        codes = [code for code, low, high in self.residues.get((chain_name, residue_id), []) if low <= insertion <= high]
+        if "H" in codes:
+            return "H"
+        if "E" in codes:
+            return "E"
+        return "C"
+
+
 class FileParser:
-    def __init__(self, file):
+    def __init__(self, file, cache=None):
         self.file = file 
-        stream = open(file)
-        self._lines = stream.readlines()
-        stream.close()
+        self.cache = cache # optional StructureCache
 
-    @property
-    def lines(self):
-        return [line for line in self._lines if len(line) >= 4]
-    
-    def parse_ca(self):
+    def records(self):
+        # stream of alpha carbon records and secondary structure, read in a single pass
+        secondary_structure = SecondaryStructure()
         records = []
-        for line in self.lines:
-            ORDINAL_START_ATOM = 0
-            ORDINAL_END_ATOM = 4
-            if line[ORDINAL_START_ATOM:ORDINAL_END_ATOM] == "ATOM":
-                ORDINAL_START_CA = 12
-                ORDINAL_END_CA = 16
-                if line[ORDINAL_START_CA:ORDINAL_END_CA].strip() == "CA":
-                    records.append(line)
-        return records
-    
-    def parse_helix(self):
-        numbers = []
-        for line in self.lines:
-            ORDINAL_START_HELIX = 0
-            ORDINAL_END_HELIX = 5
-            if line[ORDINAL_START_HELIX:ORDINAL_END_HELIX] == "HELIX":
-                ORDINAL_START_INITIAL = 21
-                ORDINAL_END_INITIAL = 25
-                initial_residue_id = int(line[ORDINAL_START_INITIAL:ORDINAL_END_INITIAL].strip())
-                ORDINAL_START_TERMINAL = 33
-                ORDINAL_END_TERMINAL = 37
-                terminal_residue_id = int(line[ORDINAL_START_TERMINAL:ORDINAL_END_TERMINAL].strip())
-                for i in range(initial_residue_id, terminal_residue_id+1):
-                    numbers.append(i)
-        return numbers
-
-    def parse_sheet(self):
-        numbers = []
-        for line in self.lines:
-            ORDINAL_START_SHEET = 0
-            ORDINAL_END_SHEET = 5
-            if line[ORDINAL_START_SHEET:ORDINAL_END_SHEET] == "SHEET":
-                ORDINAL_START_INITIAL = 22
-                ORDINAL_END_INITIAL = 26
-                initial_residue_id = int(line[ORDINAL_START_INITIAL:ORDINAL_END_INITIAL].strip())
-                ORDINAL_START_TERMINAL = 33
-                ORDINAL_END_TERMINAL = 37
-                terminal_residue_id = int(line[ORDINAL_START_TERMINAL:ORDINAL_END_TERMINAL].strip())
-                for i in range(initial_residue_id, terminal_residue_id+1):
-                    numbers.append(i)
-        return numbers
-    
-    def load_atoms(self):
-        atoms = []
-        records = self.parse_ca()
-        for record in records:
-            parser = LineParser(record)
-            id = parser.parse_id()
-            residue = parser.parse_residue()
-            residue_id = parser.parse_residue_id()
-            chain_name = parser.parse_chain_name()
-            x = parser.parse_x()
-            y = parser.parse_y()
-            z = parser.parse_z()
-            coordinates = Vec3(x=x, y=y, z=z)
-            # search secondary structure for each atom
-            if residue_id not in self.parse_helix() and residue_id not in self.parse_sheet():
-                atoms.append(CarbonAlpha(ss="C", id=id, residue=residue, residue_id=residue_id, chain_name=chain_name, coordinates=coordinates))
-            else:
-                if residue_id in self.parse_helix():
-                    atoms.append(CarbonAlpha(ss="H", id=id, residue=residue, residue_id=residue_id, chain_name=chain_name, coordinates=coordinates))
-                if residue_id in self.parse_sheet():
-                    atoms.append(CarbonAlpha(ss="E", id=id, residue=residue, residue_id=residue_id, chain_name=chain_name, coordinates=coordinates))
-        return atoms
+        with open_pdb(self.file) as stream:
+            for line in stream:
+                record = line[0:5]
+                if record[0:4] == "ATOM":
+                    if line[12:16].strip() == "CA":
+                        records.append(line)
+                elif record == "HELIX":
+                    secondary_structure.add_helix(line.ljust(38))
+                elif record == "SHEET":
+                    secondary_structure.add_sheet(line.ljust(38))
+        return records, secondary_structure
 
     def load_structure(self):
-        return Structure(atoms=self.load_atoms())
\ No newline at end of file
+        if self.cache is not None:
+            records = self.cache.get(self.file)
+            if records is not None:
+                # coordinates are copied so atoms can be moved, the other columns stay memory-mapped
+                return Structure.from_arrays(np.array(records["coordinates"]), records["id"], records["residue"], records["residue_id"], records["chain_name"], records["ss"])
+            structure = self.parse()
+            self.cache.put(self.file, structure)
+            return structure
+        return self.parse()
+
+    def parse(self):
+        records, secondary_structure = self.records()
+        count = len(records)
+        coordinates = np.empty((count, 3), dtype=np.float64)
+        ids = np.empty(count, dtype=np.int64)
+        residue_ids = np.empty(count, dtype=np.int64)
+        residues = []
+        chain_names = []
+        ss = []
+        for i, line in enumerate(records):
+            line = line.ljust(54)
+            ids[i] = int(line[6:11])
+            residues.append(line[17:20])
+            chain_names.append(line[21])
+            residue_ids[i] = int(line[22:26])
+            coordinates[i] = float(line[30:38]), float(line[38:46]), float(line[46:54])
+            # search secondary structure for each atom
+            ss.append(secondary_structure.lookup(line[21], residue_ids[i], line[26]))
+        return Structure.from_arrays(coordinates, ids, residues, residue_ids, chain_names, ss)
+
+    def load_atoms(self):
+        return self.load_structure().atoms
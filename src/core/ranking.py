@@ -0,0 +1,57 @@
+import numpy as np
+from structural import batch_rmsd
+
+# scoring and selection of generated candidates, every term is computed for the whole population at once
+
+TERMS = ["closure", "clashes", "rmsd"]
+
+
+def closure_errors(candidates, following, bond_length):
+    # deviation of the bond between the last rebuilt atom and the next fixed one from the ideal length
+    return np.abs(bond_length - np.linalg.norm(candidates[:, -1] - np.asarray(following), axis=1))
+
+
+def clash_counts(detector, candidates):
+    # clashes of every candidate, including those between fixed atoms
+    counts = np.bincount(detector.window_pairs(candidates)[:, 0], minlength=len(candidates))
+    return counts + len(detector.fixed_pairs)
+
+
+def window_rmsd(candidates, reference, superpose=False, threads=0):
+    # RMSD of the rebuilt window against the original coordinates, computed in parallel outside the GIL, threads=0 uses all cores
+    return batch_rmsd(np.ascontiguousarray(reference, dtype=np.float64), np.ascontiguousarray(candidates, dtype=np.float64), superpose, threads=threads)
+
+
+def parse_weights(text):
+    # "closure=1,rmsd=0.1" -> {"closure": 1.0, "rmsd": 0.1}
+    weights = {}
+    for item in text.split(","):
+        name, value = item.split("=")
+        if name.strip() not in TERMS:
+            raise ValueError(f"unknown score term {name}, expected one of {TERMS}")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+class Ranking:
+    def __init__(self, weights=None, max_clashes=0, superpose=False, threads=0):
+        self.weights = {"closure": 1.0, "clashes": 0.0, "rmsd": 0.0}
+        self.weights.update(weights or {})
+        self.max_clashes = max_clashes # candidates with more clashes are rejected regardless of score
+        self.superpose = superpose # window RMSD after optimal superposition
+        self.threads = threads # RMSD threads, 0 means all cores, 1 inside process pools
+
+    def scores(self, terms):
+        # with every weight zero all scores are zero and candidates keep their generation order
+        return sum((self.weights[name] * np.asarray(terms[name], dtype=np.float64) for name in TERMS if self.weights[name] != 0.0), np.zeros(len(terms["closure"])))
+
+    def select(self, terms, repeats):
+        # indices of the best repeats accepted candidates, ties are broken by candidate index
+        scores = self.scores(terms)
+        accepted = np.flatnonzero(np.asarray(terms["clashes"]) <= self.max_clashes)
+        if len(accepted) > repeats:
+            # partial sort, then exact order of the kept ones; candidates tied with the k-th score are all kept before trimming
+            threshold = np.partition(scores[accepted], repeats - 1)[repeats - 1]
+            accepted = accepted[scores[accepted] <= threshold]
+        order = np.lexsort((accepted, scores[accepted]))
+        return accepted[order][:repeats], np.count_nonzero(np.asarray(terms["clashes"]) <= self.max_clashes)
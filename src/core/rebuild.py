@@ -0,0 +1,99 @@
+import os
+import numpy as np
+from core.parser import Structure
+from core.features import fragment_labels
+from core.geometry import build_fragments
+from core.clash import ClashDetector
+from core.writer import write_pdb, write_trajectory
+from core.ranking import Ranking, closure_errors, clash_counts, window_rmsd
+
+# rebuilding a loop of a structure from decoder outputs, shared by single and batch modes
+
+BOND_LENGTH = 3.8
+
+
+def fragment_label(structure: Structure, start, end, aa=None, ss=None):
+    # sequence and secondary structure are read from the structure unless given
+    aa = structure.read_sequence(start, end) if aa is None else aa
+    ss = structure.read_secondary_structure(start, end) if ss is None else ss
+    displacement = structure.local_displacement(start, end)
+    return aa, ss, [displacement.x, displacement.y, displacement.z]
+
+
+def labels(structure: Structure, start, end, population, aa=None, ss=None):
+    aa, ss, displacement = fragment_label(structure, start, end, aa, ss)
+    return fragment_labels(aa, ss, *displacement, population)
+
+
+def window(structure: Structure, start, end):
+    # indices of rebuilt atoms and their positions in generated fragments
+    # only the chain of the initial residue is rebuilt
+    residue_ids = structure.residue_ids()
+    chain = structure.chain_names() == structure.chain_names()[structure.find_residue(start)]
+    indices = np.flatnonzero(chain & (residue_ids >= start) & (residue_ids <= end))
+    return indices, residue_ids[indices] - start
+
+
+def build_candidates(structure: Structure, start, end, vectors):
+    # (population, window, 3) coordinates of rebuilt atoms
+    # bound atoms not included in rebuilt fragment
+    anchors = [structure.find_residue(start-3), structure.find_residue(start-2), structure.find_residue(start-1)]
+    if None in anchors:
+        raise ValueError(f"residues {start-3} to {start-1} preceding the fragment are missing")
+    c_1, c_2, c_3 = structure.coordinates_array()[anchors]
+
+    # convert generated angles to cartesian
+    fragments = build_fragments(c_1, c_2, c_3, vectors, BOND_LENGTH)
+    _, positions = window(structure, start, end)
+    return fragments[:, positions]
+
+
+def score_setup(structure: Structure, start, end):
+    # clash detector, next fixed atom and original window coordinates, the same for every candidate of a loop
+    indices, _ = window(structure, start, end)
+    detector = ClashDetector(structure.coordinates_array(), structure.residue_ids(), tolerance=1.0, window=indices)
+    following = structure.find_residue(end+1)
+    if following is None:
+        raise ValueError(f"residue {end+1} following the fragment is missing")
+    following = structure.coordinates_array()[following]
+    return detector, following, structure.coordinates_array()[indices]
+
+
+def score_candidates(setup, candidates, superpose=False, threads=0):
+    # closure error, clash count and window RMSD of every candidate
+    detector, following, reference = setup
+    return {
+        "closure": closure_errors(candidates, following, BOND_LENGTH),
+        "clashes": clash_counts(detector, candidates),
+        "rmsd": window_rmsd(candidates, reference, superpose, threads),
+    }
+
+
+def score(structure: Structure, start, end, candidates, superpose=False, threads=0):
+    return score_candidates(score_setup(structure, start, end), candidates, superpose, threads)
+
+
+def rank(structure: Structure, start, end, candidates, repeats, ranking=None):
+    # coordinates and score terms of the best candidates, by default structures which are not crossed ordered by the closure error
+    ranking = Ranking() if ranking is None else ranking
+    terms = score(structure, start, end, candidates, ranking.superpose, ranking.threads)
+    selected, accepted = ranking.select(terms, repeats)
+    return candidates[selected], {name: values[selected] for name, values in terms.items()}, accepted
+
+
+def write_models(path, structure: Structure, start, end, coordinates, scores, format="pdb"):
+    # whole structures with the rebuilt window replaced, as multi-model PDB or memory-mappable trajectory
+    indices, _ = window(structure, start, end)
+    models = np.repeat(structure.coordinates_array()[None], len(coordinates), axis=0)
+    models[:, indices] = coordinates
+    if format == "trajectory":
+        write_trajectory(path, structure, models, scores)
+    else:
+        write_pdb(path, structure, models, scores)
+
+
+def output_path(directory, pdb, start, end=None, format="pdb"):
+    pdb_name = os.path.splitext(os.path.basename(pdb))[0]
+    suffix = "" if end is None else f"_{start}_{end}"
+    extension = "traj" if format == "trajectory" else "pdb"
+    return f"{directory}/{pdb_name}{suffix}_output.{extension}"
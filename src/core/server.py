@@ -0,0 +1,167 @@
+import json
+import time
+import queue
+import threading
+import collections
+import urllib.request
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from core.features import fragment_labels
+from core.inference import load_decoder
+
+# long-lived fragment generation service keeping decoders loaded between requests
+# concurrent requests for the same model are merged into single decoder.predict calls
+
+
+class Request:
+    def __init__(self, labels):
+        self.labels = labels
+        self.vectors = None
+        self.error = None
+        self.done = threading.Event()
+        self.created = time.perf_counter()
+
+
+class Batcher:
+    def __init__(self, model, max_batch, max_wait, sampling="empirical", engine="auto"):
+        self.decoder = load_decoder(model, engine=engine, sampling=sampling)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, labels):
+        request = Request(labels)
+        self.queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.vectors
+
+    def collect(self):
+        # block for the first request, then gather more until the batch is full or the wait runs out
+        requests = [self.queue.get()]
+        rows = len(requests[0].labels)
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            requests.append(request)
+            rows += len(request.labels)
+        return requests
+
+    def predict(self, requests):
+        try:
+            vectors = self.decoder.predict(np.concatenate([request.labels for request in requests]))
+            start = 0
+            for request in requests:
+                request.vectors = vectors[start:start+len(request.labels)]
+                start += len(request.labels)
+        except Exception as error:
+            for request in requests:
+                request.error = error
+
+    def loop(self):
+        while True:
+            requests = self.collect()
+            # requests of one label width share a decoder call, so a malformed request fails alone
+            groups = collections.defaultdict(list)
+            for request in requests:
+                groups[np.shape(request.labels)[1:]].append(request)
+            for group in groups.values():
+                self.predict(group)
+            for request in requests:
+                request.done.set()
+
+
+class FragmentServer(ThreadingHTTPServer):
+    def __init__(self, address, max_batch=100000, max_wait=0.005):
+        super().__init__(address, FragmentHandler)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batchers = {} # one loaded decoder per model directory, sampling mode and engine
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=10000)
+
+    def batcher(self, model, sampling="empirical", engine="auto"):
+        key = (model, sampling, engine)
+        with self.lock:
+            if key not in self.batchers:
+                self.batchers[key] = Batcher(model, self.max_batch, self.max_wait, sampling=sampling, engine=engine)
+            return self.batchers[key]
+
+    def generate(self, model, aa, ss, displacement, population, sampling="empirical", engine="auto"):
+        start = time.perf_counter()
+        labels = fragment_labels(aa, ss, *displacement, population)
+        vectors = self.batcher(model, sampling, engine).submit(labels)
+        self.latencies.append(time.perf_counter() - start)
+        return vectors
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) > 0 else [0.0, 0.0, 0.0]
+        return {
+            "models": [{"model": model, "sampling": sampling, "engine": engine} for model, sampling, engine in self.batchers],
+            "queue_depth": sum(batcher.queue.qsize() for batcher in self.batchers.values()),
+            "requests": len(latencies),
+            "latency_ms": dict(zip(["p50", "p90", "p99"], percentiles)),
+        }
+
+
+class FragmentHandler(BaseHTTPRequestHandler):
+    def reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.reply(200, self.server.stats())
+        else:
+            self.reply(404, {"error": "unknown path"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self.reply(404, {"error": "unknown path"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            vectors = self.server.generate(request["model"], request["aa"], request["ss"], request["displacement"], request["population"],
+                                           sampling=request.get("sampling", "empirical"), engine=request.get("engine", "auto"))
+        except (KeyError, ValueError) as error:
+            self.reply(400, {"error": str(error)})
+            return
+        except Exception as error:
+            self.reply(500, {"error": f"{type(error).__name__}: {error}"})
+            return
+        self.reply(200, {"vectors": np.asarray(vectors).tolist()})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FragmentClient:
+    def __init__(self, address):
+        self.url = f"http://{address}"
+
+    def request(self, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def generate(self, model, aa, ss, displacement, population, sampling="empirical", engine="auto"):
+        body = {"model": model, "aa": aa, "ss": ss, "displacement": list(displacement), "population": population, "sampling": sampling, "engine": engine}
+        return np.array(self.request("/generate", body)["vectors"])
+
+    def stats(self):
+        return self.request("/stats")
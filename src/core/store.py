@@ -0,0 +1,152 @@
+import os
+import json
+import numpy as np
+from core.features import AA_CODES, SS_CODES, fragment_length, parse_lines, format_inputs, format_labels
+
+# sharded binary storage of fragments indexed by length and secondary structure composition
+# every shard is a directory of .npy columns which can be memory-mapped independently
+
+MANIFEST = "manifest.json"
+COLUMNS = ["aa", "ss", "displacement", "angles", "composition"]
+
+
+def ss_composition(ss):
+    # (rows, n) secondary structure indices -> (rows, 3) counts of H, E and C
+    rows = np.shape(ss)[0]
+    composition = np.zeros((rows, len(SS_CODES)), dtype=np.uint16)
+    for i in range(len(SS_CODES)):
+        composition[:, i] = np.count_nonzero(ss == i, axis=1)
+    return composition
+
+
+class FragmentStoreWriter:
+    def __init__(self, directory, shard_size=1000000):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.shards = []
+        self.buffers = {} # pending lines grouped by fragment length
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, line):
+        if not line.strip():
+            return
+        n = fragment_length(line)
+        buffer = self.buffers.setdefault(n, [])
+        buffer.append(line)
+        if len(buffer) == self.shard_size:
+            self.flush(n)
+
+    def add_file(self, file):
+        with open(file) as stream:
+            for line in stream:
+                self.add(line)
+
+    def flush(self, n):
+        lines = self.buffers.pop(n, [])
+        if not lines:
+            return
+        columns = parse_lines(lines, n)
+        columns["aa"] = columns["aa"].astype(np.uint8)
+        columns["ss"] = columns["ss"].astype(np.uint8)
+        columns["composition"] = ss_composition(columns["ss"])
+
+        name = f"n{n}/shard_{sum(1 for shard in self.shards if shard['n'] == n):05d}"
+        path = os.path.join(self.directory, name)
+        os.makedirs(path, exist_ok=True)
+        for column in COLUMNS:
+            np.save(os.path.join(path, f"{column}.npy"), columns[column])
+
+        # composition bounds let queries skip whole shards
+        fractions = columns["composition"] / n
+        self.shards.append({
+            "name": name,
+            "n": n,
+            "rows": len(lines),
+            "min_fraction": fractions.min(axis=0).tolist(),
+            "max_fraction": fractions.max(axis=0).tolist(),
+        })
+
+    def close(self):
+        for n in list(self.buffers):
+            self.flush(n)
+        with open(os.path.join(self.directory, MANIFEST), "w") as stream:
+            json.dump({"aa_codes": AA_CODES, "ss_codes": SS_CODES, "shards": self.shards}, stream, indent=2)
+
+
+class FragmentSubset:
+    def __init__(self, n, aa, ss, displacement, angles):
+        self.n = n
+        self.aa = aa
+        self.ss = ss
+        self.displacement = displacement
+        self.angles = angles
+
+    def __len__(self):
+        return len(self.aa)
+
+    @property
+    def alpha(self):
+        return self.angles[:, 0::2]
+
+    @property
+    def theta(self):
+        return self.angles[:, 1::2]
+
+    def inputs(self):
+        # the same layout as InputMLP.format
+        return format_inputs(alpha=self.alpha, theta=self.theta)
+
+    def labels(self):
+        # the same layout as LabelMLP.format
+        return format_labels(displacement=self.displacement, aa=self.aa, ss=self.ss)
+
+
+class FragmentStore:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as stream:
+            self.manifest = json.load(stream)
+
+    @property
+    def shards(self):
+        return self.manifest["shards"]
+
+    def lengths(self):
+        return sorted({shard["n"] for shard in self.shards})
+
+    def rows(self, n=None):
+        return sum(shard["rows"] for shard in self.shards if n is None or shard["n"] == n)
+
+    def column(self, shard, column):
+        return np.load(os.path.join(self.directory, shard["name"], f"{column}.npy"), mmap_mode="r")
+
+    @staticmethod
+    def bounds(helix, strand, coil):
+        # fraction ranges in the H, E, C order, None means no restriction
+        ranges = [helix, strand, coil]
+        return [(0.0, 1.0) if bound is None else bound for bound in ranges]
+
+    def select(self, n, helix=None, strand=None, coil=None):
+        # rows of fragments of length n whose SS fractions fall into the given (min, max) ranges
+        bounds = self.bounds(helix, strand, coil)
+        parts = {column: [] for column in ["aa", "ss", "displacement", "angles"]}
+        for shard in self.shards:
+            if shard["n"] != n:
+                continue
+            if any(shard["max_fraction"][i] < low or shard["min_fraction"][i] > high for i, (low, high) in enumerate(bounds)):
+                continue
+
+            fractions = self.column(shard, "composition") / n
+            mask = np.ones(shard["rows"], dtype=bool)
+            for i, (low, high) in enumerate(bounds):
+                mask &= (fractions[:, i] >= low) & (fractions[:, i] <= high)
+            indices = np.flatnonzero(mask)
+            if len(indices) == 0:
+                continue
+
+            for column in parts:
+                parts[column].append(self.column(shard, column)[indices])
+
+        if not parts["aa"]:
+            return FragmentSubset(n=n, aa=np.empty((0, n), dtype=np.uint8), ss=np.empty((0, n), dtype=np.uint8), displacement=np.empty((0, 3), dtype=np.float32), angles=np.empty((0, 2 * n), dtype=np.float32))
+        return FragmentSubset(n=n, **{column: np.concatenate(values) for column, values in parts.items()})
@@ -0,0 +1,78 @@
+import os
+import json
+import random
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# hyperparameter sweeps over Trainer configurations
+# runs share the data through read-only memory-mapped inputs/labels, so the page cache holds a single copy
+
+SWEPT = ["encoder_h", "decoder_h", "latent_dim", "beta", "learning_rate"]
+
+
+def grid(space):
+    # every combination of listed values
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*[space[key] for key in keys])]
+
+
+def random_search(space, samples, seed=None):
+    # independent draws from listed values
+    generator = random.Random(seed)
+    return [{key: generator.choice(values) for key, values in space.items()} for _ in range(samples)]
+
+
+def write_configs(base, combinations, directory):
+    # one directory per run, Trainer writes all its artifacts next to its config
+    with open(base) as stream:
+        parameters = json.load(stream)
+    for key in ["inputs", "labels", "store"]:
+        if parameters.get(key) is not None:
+            parameters[key] = os.path.abspath(parameters[key]) # resolved like Trainer.load_data does
+
+    configs = []
+    for i, combination in enumerate(combinations):
+        run_directory = os.path.join(directory, f"run_{i:04d}")
+        os.makedirs(run_directory, exist_ok=True)
+        config = os.path.join(run_directory, "config.json")
+        with open(config, "w") as stream:
+            json.dump({**parameters, **combination}, stream, indent=2)
+        configs.append(config)
+    return configs
+
+
+def limit_threads(threads):
+    # keep concurrent runs from oversubscribing the cores
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run(config):
+    from core.model import Trainer
+    trainer = Trainer(config=config)
+    trainer.train()
+    trainer.save()
+
+    last = trainer.history[-1]
+    return {
+        "config": config,
+        "parameters": {key: getattr(trainer, key) for key in SWEPT},
+        "epochs": last["epoch"],
+        "total": last["total"],
+        "validation_total": last.get("validation_total"),
+        **trainer.throughput(),
+    }
+
+
+def score(result):
+    return result["validation_total"] if result["validation_total"] is not None else result["total"]
+
+
+def sweep(configs, processes, threads=1):
+    # spawned workers do not inherit a TensorFlow runtime from the parent
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=limit_threads, initargs=(threads,)) as executor:
+        results = list(executor.map(run, configs))
+    return sorted(results, key=score)
@@ -1,9 +1,17 @@
 use std::io::BufReader;
+use std::io::BufWriter;
+use std::io::Write;
 use std::fs::read_dir;
+use std::fs::OpenOptions;
 use std::io::BufRead;
 use std::path::Path;
 use std::ffi::OsStr;
 use std::fs::File;
+use std::collections::BTreeMap;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::mpsc::sync_channel;
+use std::thread;
+use std::time::Instant;
 use pyo3::prelude::*;
 
 // some functionalities for data generating
@@ -21,6 +29,10 @@ pub fn get_extension(file: &str) -> Option<&str>
 pub fn check_if_correct(line: &str) -> bool
 {
     let elements: Vec<&str> = line.split_whitespace().collect();  
+    if elements.len() < 6
+    {
+        return false;
+    }
     let aa: Vec<char> = elements[4].chars().collect();
     let ss: Vec<char> = elements[5].chars().collect();
 
@@ -89,4 +101,163 @@ pub fn all_samples(directory: &str) -> Vec<String>
         }
     }
     samples
-}
\ No newline at end of file
+}
+
+#[pyclass]
+#[derive(Clone)]
+pub struct CollectionReport
+{
+    #[pyo3(get)]
+    pub files: usize,
+    #[pyo3(get)]
+    pub failed_files: usize,
+    #[pyo3(get)]
+    pub lines: usize,
+    #[pyo3(get)]
+    pub rejected_lines: usize,
+    #[pyo3(get)]
+    pub seconds: f64,
+}
+
+#[pymethods]
+impl CollectionReport
+{
+    pub fn files_per_second(&self) -> f64
+    {
+        if self.seconds > 0.0 { self.files as f64 / self.seconds } else { 0.0 }
+    }
+
+    pub fn lines_per_second(&self) -> f64
+    {
+        if self.seconds > 0.0 { self.lines as f64 / self.seconds } else { 0.0 }
+    }
+
+    fn __repr__(&self) -> String
+    {
+        format!("CollectionReport(files={}, failed_files={}, lines={}, rejected_lines={}, seconds={:.3})", self.files, self.failed_files, self.lines, self.rejected_lines, self.seconds)
+    }
+}
+
+// accepted lines of a single file and the number of rejected ones, unreadable files are reported as errors
+fn filter_file(file: &str) -> std::io::Result<(Vec<String>, usize)>
+{
+    let stream = File::open(Path::new(file))?;
+    let reader = BufReader::new(stream);
+    let mut lines = Vec::new();
+    let mut rejected: usize = 0;
+    for line in reader.lines()
+    {
+        let line = line?;
+        if check_if_correct(&line)
+        {
+            lines.push(line);
+        }
+        else
+        {
+            rejected += 1;
+        }
+    }
+    Ok((lines, rejected))
+}
+
+fn find_files(directory: &str) -> std::io::Result<Vec<String>>
+{
+    let mut files = Vec::new();
+    for item in read_dir(directory)?
+    {
+        let file = item?.path().display().to_string();
+        if get_extension(&file) == Some("dat")
+        {
+            files.push(file);
+        }
+    }
+    files.sort();
+    Ok(files)
+}
+
+// files are validated by worker threads while the calling thread appends accepted lines to the output
+pub fn collect_samples(files: &[String], output: &str, threads: usize) -> std::io::Result<CollectionReport>
+{
+    let start = Instant::now();
+    let threads = if threads == 0 { thread::available_parallelism().map(|n| n.get()).unwrap_or(1) } else { threads };
+    let threads = threads.min(files.len()).max(1);
+
+    let stream = OpenOptions::new().create(true).append(true).open(output)?;
+    let mut writer = BufWriter::new(stream);
+
+    let next = AtomicUsize::new(0);
+    let (sender, receiver) = sync_channel::<(usize, Option<(Vec<String>, usize)>)>(2 * threads); // bounded, so memory stays proportional to the number of threads
+
+    let mut report = CollectionReport{files: 0, failed_files: 0, lines: 0, rejected_lines: 0, seconds: 0.0};
+    let mut written: std::io::Result<()> = Ok(());
+    thread::scope(|scope|
+    {
+        for _ in 0..threads
+        {
+            let sender = sender.clone();
+            let next = &next;
+            scope.spawn(move ||
+            {
+                loop
+                {
+                    let i = next.fetch_add(1, Ordering::Relaxed);
+                    if i >= files.len()
+                    {
+                        break;
+                    }
+                    if sender.send((i, filter_file(&files[i]).ok())).is_err()
+                    {
+                        break;
+                    }
+                }
+            });
+        }
+        drop(sender);
+
+        // files finish in any order, they are written in the sorted order of paths so the output is reproducible
+        let mut pending = BTreeMap::new();
+        let mut next_written = 0;
+        for (i, result) in receiver.iter()
+        {
+            pending.insert(i, result);
+            while let Some(result) = pending.remove(&next_written)
+            {
+                next_written += 1;
+                match result
+                {
+                    Some((lines, rejected)) =>
+                    {
+                        report.files += 1;
+                        report.lines += lines.len();
+                        report.rejected_lines += rejected;
+                        if written.is_ok()
+                        {
+                            for line in lines.iter()
+                            {
+                                if let Err(error) = writeln!(writer, "{}", line)
+                                {
+                                    written = Err(error);
+                                    break;
+                                }
+                            }
+                        }
+                    }
+                    None => report.failed_files += 1,
+                }
+            }
+        }
+    });
+    written?;
+    writer.flush()?;
+
+    report.seconds = start.elapsed().as_secs_f64();
+    Ok(report)
+}
+
+#[pyfunction]
+pub fn write_samples(py: Python, directory: &str, output: &str, threads: usize) -> PyResult<CollectionReport>
+{
+    let files = find_files(directory)?;
+    let report = py.allow_threads(|| collect_samples(&files, output, threads))?;
+    Ok(report)
+}
@@ -1,6 +1,9 @@
 use std::clone::Clone;
 use std::f64::consts::PI;
+use std::thread;
 use pyo3::prelude::*;
+use pyo3::exceptions::PyValueError;
+use numpy::{IntoPyArray, PyArray1, PyReadonlyArray1, PyReadonlyArray2, PyReadonlyArray3};
 
 #[pyclass]
 #[derive(Clone)]
@@ -307,4 +310,179 @@ pub fn compute_rmsd(a: Vec<Vec3>, b: Vec<Vec3>) -> f64
     let mut rmsd: f64 = square_displacements.iter().sum();
     rmsd = (rmsd / square_displacements.len() as f64).sqrt();
     rmsd
-}
\ No newline at end of file
+}
+
+// largest eigenvalue of a symmetric 4x4 matrix, cyclic Jacobi rotations
+fn largest_eigenvalue(mut m: [[f64; 4]; 4]) -> f64
+{
+    for _ in 0..50
+    {
+        let mut off: f64 = 0.0;
+        for p in 0..4
+        {
+            for q in (p+1)..4
+            {
+                off += m[p][q] * m[p][q];
+            }
+        }
+        if off < 1e-22
+        {
+            break;
+        }
+        for p in 0..4
+        {
+            for q in (p+1)..4
+            {
+                if m[p][q].abs() < 1e-300
+                {
+                    continue;
+                }
+                let theta: f64 = (m[q][q] - m[p][p]) / (2.0 * m[p][q]);
+                let t: f64 = theta.signum() / (theta.abs() + (theta * theta + 1.0).sqrt());
+                let c: f64 = 1.0 / (t * t + 1.0).sqrt();
+                let s: f64 = t * c;
+                for k in 0..4
+                {
+                    let (m_kp, m_kq) = (m[k][p], m[k][q]);
+                    m[k][p] = c * m_kp - s * m_kq;
+                    m[k][q] = s * m_kp + c * m_kq;
+                }
+                for k in 0..4
+                {
+                    let (m_pk, m_qk) = (m[p][k], m[q][k]);
+                    m[p][k] = c * m_pk - s * m_qk;
+                    m[q][k] = s * m_pk + c * m_qk;
+                }
+            }
+        }
+    }
+    m[0][0].max(m[1][1]).max(m[2][2]).max(m[3][3])
+}
+
+// RMSD of selected atoms of two flat (n * 3) coordinate lists, optionally after optimal superposition
+fn pair_rmsd(a: &[f64], b: &[f64], indices: &[usize], superpose: bool) -> f64
+{
+    if indices.is_empty()
+    {
+        return 0.0;
+    }
+    let n = indices.len() as f64;
+    if !superpose
+    {
+        let mut sum: f64 = 0.0;
+        for &i in indices
+        {
+            for k in 0..3
+            {
+                let d = a[3*i+k] - b[3*i+k];
+                sum += d * d;
+            }
+        }
+        return (sum / n).sqrt();
+    }
+
+    let mut center_a = [0.0; 3];
+    let mut center_b = [0.0; 3];
+    for &i in indices
+    {
+        for k in 0..3
+        {
+            center_a[k] += a[3*i+k] / n;
+            center_b[k] += b[3*i+k] / n;
+        }
+    }
+
+    // correlation matrix and inner products of centered coordinates
+    let mut r = [[0.0; 3]; 3];
+    let mut g_a: f64 = 0.0;
+    let mut g_b: f64 = 0.0;
+    for &i in indices
+    {
+        let x = [a[3*i] - center_a[0], a[3*i+1] - center_a[1], a[3*i+2] - center_a[2]];
+        let y = [b[3*i] - center_b[0], b[3*i+1] - center_b[1], b[3*i+2] - center_b[2]];
+        for p in 0..3
+        {
+            g_a += x[p] * x[p];
+            g_b += y[p] * y[p];
+            for q in 0..3
+            {
+                r[p][q] += x[p] * y[q];
+            }
+        }
+    }
+
+    // Horn's quaternion matrix, its largest eigenvalue gives the optimal rotation without computing it
+    let (s_xx, s_xy, s_xz) = (r[0][0], r[0][1], r[0][2]);
+    let (s_yx, s_yy, s_yz) = (r[1][0], r[1][1], r[1][2]);
+    let (s_zx, s_zy, s_zz) = (r[2][0], r[2][1], r[2][2]);
+    let k = [
+        [s_xx + s_yy + s_zz, s_yz - s_zy, s_zx - s_xz, s_xy - s_yx],
+        [s_yz - s_zy, s_xx - s_yy - s_zz, s_xy + s_yx, s_zx + s_xz],
+        [s_zx - s_xz, s_xy + s_yx, -s_xx + s_yy - s_zz, s_yz + s_zy],
+        [s_xy - s_yx, s_zx + s_xz, s_yz + s_zy, -s_xx - s_yy + s_zz],
+    ];
+    let lambda = largest_eigenvalue(k);
+    ((g_a + g_b - 2.0 * lambda) / n).max(0.0).sqrt()
+}
+
+// candidates are split between threads, each one writes its own part of the result
+pub fn batch_rmsd_slices(reference: &[f64], candidates: &[f64], n: usize, indices: &[usize], superpose: bool, threads: usize) -> Vec<f64>
+{
+    if n == 0
+    {
+        return Vec::new();
+    }
+    let population = candidates.len() / (3 * n);
+    let mut rmsd = vec![0.0; population];
+    if population == 0
+    {
+        return rmsd;
+    }
+    let threads = if threads == 0 { thread::available_parallelism().map(|n| n.get()).unwrap_or(1) } else { threads };
+    let chunk = ((population + threads - 1) / threads).max(1);
+
+    thread::scope(|scope|
+    {
+        for (block, values) in candidates.chunks(chunk * 3 * n).zip(rmsd.chunks_mut(chunk))
+        {
+            scope.spawn(move ||
+            {
+                for (i, value) in values.iter_mut().enumerate()
+                {
+                    *value = pair_rmsd(reference, &block[i*3*n..(i+1)*3*n], indices, superpose);
+                }
+            });
+        }
+    });
+    rmsd
+}
+
+#[pyfunction]
+#[args(superpose = "false", mask = "None", threads = "0")]
+pub fn batch_rmsd(py: Python, reference: PyReadonlyArray2<f64>, candidates: PyReadonlyArray3<f64>, superpose: bool, mask: Option<PyReadonlyArray1<bool>>, threads: usize) -> PyResult<Py<PyArray1<f64>>>
+{
+    // (n, 3) reference and (population, n, 3) candidates -> RMSD of every candidate over atoms selected by mask
+    let n = reference.shape()[0];
+    if reference.shape()[1] != 3 || candidates.shape()[1] != n || candidates.shape()[2] != 3
+    {
+        return Err(PyValueError::new_err("expected (n, 3) reference and (population, n, 3) candidates"));
+    }
+    let indices: Vec<usize> = match &mask
+    {
+        Some(mask) =>
+        {
+            let mask = mask.as_slice()?;
+            if mask.len() != n
+            {
+                return Err(PyValueError::new_err("mask length differs from the number of atoms"));
+            }
+            (0..n).filter(|&i| mask[i]).collect()
+        }
+        None => (0..n).collect(),
+    };
+    let reference = reference.as_slice()?;
+    let candidates = candidates.as_slice()?;
+
+    let rmsd = py.allow_threads(|| batch_rmsd_slices(reference, candidates, n, &indices, superpose, threads));
+    Ok(rmsd.into_pyarray(py).to_owned())
+}
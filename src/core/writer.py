@@ -0,0 +1,56 @@
+import os
+import numpy as np
+
+# output of many candidate models at once
+# multi-model PDB is formatted in bulk with scores in REMARK records, trajectories keep arrays which can be memory-mapped
+
+ATOM_PREFIX = "ATOM  %5d  CA  %3s %1s%4d    "
+ATOM_SUFFIX = "%8.3f%8.3f%8.3f  1.00  0.00           C"
+TOPOLOGY = np.dtype([("id", np.int64), ("residue", "U3"), ("residue_id", np.int64), ("chain_name", "U1"), ("ss", "U1")])
+
+
+def atom_prefixes(structure):
+    # columns which are the same in every model
+    return [ATOM_PREFIX % (id % 100000, residue, chain_name, residue_id) for id, residue, chain_name, residue_id in zip(structure.ids().tolist(), structure.residues().tolist(), structure.chain_names().tolist(), structure.residue_ids().tolist())]
+
+
+def score_remarks(scores):
+    names = list(scores)
+    count = len(scores[names[0]]) if names else 0
+    for i in range(count):
+        values = " ".join(f"{name} {scores[name][i]}" if np.issubdtype(np.asarray(scores[name]).dtype, np.integer) else f"{name} {scores[name][i]:.3f}" for name in names)
+        yield f"REMARK 999 MODEL {i+1:4d} {values}\n"
+
+
+def write_pdb(path, structure, coordinates, scores):
+    # (models, N, 3) coordinates of whole structures
+    prefixes = atom_prefixes(structure)
+    with open(path, "w", buffering=1 << 20) as stream:
+        stream.writelines(score_remarks(scores))
+        for i, model in enumerate(np.asarray(coordinates).tolist()):
+            atoms = "\n".join(prefix + ATOM_SUFFIX % (x, y, z) for prefix, (x, y, z) in zip(prefixes, model))
+            stream.write(f"MODEL     {i+1:4d}\n{atoms}\nENDMDL\n")
+        stream.write("END\n")
+
+
+def write_trajectory(directory, structure, coordinates, scores):
+    # coordinates.npy (models, N, 3), scores.npy with one record per model, topology.npy with one record per atom
+    os.makedirs(directory, exist_ok=True)
+    np.save(f"{directory}/coordinates.npy", np.asarray(coordinates, dtype=np.float32))
+
+    table = np.empty(len(coordinates), dtype=[(name, np.asarray(values).dtype) for name, values in scores.items()])
+    for name, values in scores.items():
+        table[name] = values
+    np.save(f"{directory}/scores.npy", table)
+
+    topology = np.empty(structure.length(), dtype=TOPOLOGY)
+    topology["id"] = structure.ids()
+    topology["residue"] = structure.residues()
+    topology["residue_id"] = structure.residue_ids()
+    topology["chain_name"] = structure.chain_names()
+    topology["ss"] = structure.secondary_structure()
+    np.save(f"{directory}/topology.npy", topology)
+
+
+def read_trajectory(directory):
+    return tuple(np.load(f"{directory}/{name}.npy", mmap_mode="r") for name in ["coordinates", "scores", "topology"])